@@ -0,0 +1,206 @@
+"""
+check_results.py
+Version 1.0 — Created by Sean P. Harrington with assistance from Microsoft Copilot
+
+Quick audit of the photo duplicate detection database (photo_duplicates.db).
+Prints overall statistics plus a sample of the largest duplicate groups so the
+results of a dedup run can be sanity-checked before any files are removed.
+
+Requirements:
+    oby.cfg must be present in the same folder.
+
+Usage:
+    python check_results.py
+"""
+
+import os
+import sqlite3
+import itertools
+import configparser
+import urllib.request
+
+# === LOAD CONFIG ===
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(__file__), "oby.cfg"))
+
+PHOTO_DIR = config.get("paths", "photo_dir")
+DB_PATH = os.path.join(PHOTO_DIR, "photo_duplicates.db")
+
+# One aggregate query instead of five separate scalar queries, so SQLite
+# scans photo_files once rather than five times.
+SUMMARY_SQL = """
+    SELECT COUNT(*),
+           SUM(binary_verified = 1 AND is_original = 0),
+           SUM(is_original = 1),
+           SUM(removal_flagged = 1),
+           COALESCE(SUM(CASE WHEN removal_flagged = 1 THEN file_size END), 0)
+    FROM photo_files
+"""
+
+# Single query: top-5 groups joined to their member rows in one round trip,
+# instead of one query per group (N+1 pattern). Reads the v_duplicate_report
+# view, which SQLite inlines, so the covering index still applies.
+SAMPLE_SQL = """
+    WITH top_groups AS (
+        SELECT normalized_hash, COUNT(*) AS group_size
+        FROM v_duplicate_report
+        GROUP BY normalized_hash
+        HAVING COUNT(*) > 1
+        ORDER BY group_size DESC
+        LIMIT 5
+    )
+    SELECT v.normalized_hash, t.group_size,
+           substr(v.relative_path, 1, 60),
+           v.is_original, v.size_pretty, v.status
+    FROM v_duplicate_report v
+    JOIN top_groups t USING (normalized_hash)
+    ORDER BY t.group_size DESC, v.normalized_hash, v.is_original DESC
+"""
+
+GROUPS_SQL = "SELECT COUNT(*) FROM duplicate_groups"
+
+# Memoized totals: the summary aggregates only change when the dedup
+# pipeline runs, so the pipeline refreshes this one-row table at end of
+# run and the report reads it back constant-time instead of re-scanning
+# photo_files every invocation.
+CACHED_SUMMARY_SQL = "SELECT total, dups, originals, flagged, bytes FROM report_summary"
+
+
+def refresh_summary(conn):
+    """Recompute the report_summary cache table (called by the pipeline)."""
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS report_summary
+            (total INTEGER, dups INTEGER, originals INTEGER, flagged INTEGER, bytes INTEGER)
+        """)
+        conn.execute("DELETE FROM report_summary")
+        conn.execute("INSERT INTO report_summary " + SUMMARY_SQL)
+
+
+def ensure_indexes(db_path):
+    """Create the report indexes and refresh planner statistics.
+
+    Index maintenance needs a brief read-write connection; the report
+    itself runs over a read-only connection (see open_readonly).
+    """
+    with sqlite3.connect(db_path) as idx_conn:
+        idx_conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_pf_flag_orig ON photo_files(binary_verified, is_original, removal_flagged, file_size);
+            CREATE INDEX IF NOT EXISTS idx_pf_removal ON photo_files(removal_flagged) WHERE removal_flagged = 1;
+            CREATE INDEX IF NOT EXISTS idx_pf_hash_cover ON photo_files(normalized_hash, is_original, file_size, relative_path);
+            CREATE VIEW IF NOT EXISTS v_duplicate_report AS
+                SELECT p.normalized_hash, p.relative_path, p.is_original, p.file_size,
+                       printf('%.2f MB', p.file_size / 1048576.0) AS size_pretty,
+                       CASE p.is_original WHEN 1 THEN 'ORIGINAL' ELSE 'DUPLICATE' END AS status
+                FROM photo_files p
+                WHERE p.binary_verified = 1;
+            ANALYZE photo_files;
+        """)
+    idx_conn.close()
+
+
+def open_readonly(db_path):
+    """Open the database read-only with lock-free, cache-friendly settings.
+
+    immutable=1 lets SQLite skip all locking round trips — each lock
+    acquisition is a network round trip over SMB. cached_statements keeps
+    every report statement prepared for the life of the connection; the
+    SQL strings above are module-level constants so each execute passes
+    byte-identical text and always hits the statement cache.
+
+    The URI is built via pathname2url: photo_dir is a UNC path on the
+    primary deployment, and Path.as_uri() would put the server into the
+    URI authority (file://NAS-MEDIA/...), which SQLite rejects.
+    pathname2url keeps the authority empty the way SQLite documents for
+    UNC. If the URI open still fails, fall back to a plain connection —
+    slower locking, but the report always runs.
+    """
+    db_uri = ("file:" + urllib.request.pathname2url(os.path.abspath(db_path))
+              + "?mode=ro&immutable=1")
+    try:
+        conn = sqlite3.connect(db_uri, uri=True, cached_statements=256)
+    except sqlite3.OperationalError:
+        conn = sqlite3.connect(db_path, cached_statements=256)
+    conn.executescript("""
+        PRAGMA query_only = 1;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA cache_size = -65536;
+        PRAGMA mmap_size = 268435456;
+    """)
+    return conn
+
+
+def assert_indexed(cursor, sql, params=()):
+    """Fail fast if a report query regressed to an un-indexed table scan."""
+    plan = cursor.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    assert not any("SCAN photo_files" in row[3] and "USING" not in row[3]
+                   for row in plan), plan
+
+
+def print_report(conn):
+    """Print the audit report over an already-open connection.
+
+    Accepting the connection lets a long-running caller (watch script,
+    notebook) keep one connection alive across runs, so the page cache
+    stays warm and repeat reports are effectively memory-resident.
+    """
+    cursor = conn.cursor()
+
+    # Verify each report query hits an index before printing anything — a
+    # regressed plan on a NAS-sized database silently costs minutes.
+    assert_indexed(cursor, SUMMARY_SQL)
+    assert_indexed(cursor, SAMPLE_SQL)
+
+    print("=" * 60)
+    print("PHOTO DUPLICATE DETECTION RESULTS")
+    print("=" * 60)
+
+    # === SUMMARY COUNTS ===
+    # Prefer the memoized report_summary row; fall back to the live
+    # aggregate for databases written before the cache table existed.
+    try:
+        summary_row = cursor.execute(CACHED_SUMMARY_SQL).fetchone()
+    except sqlite3.OperationalError:
+        summary_row = None
+    if summary_row is None:
+        summary_row = cursor.execute(SUMMARY_SQL).fetchone()
+    (total_files, total_duplicates, total_originals,
+     flagged_for_removal, space_recoverable_bytes) = summary_row
+
+    cursor.execute(GROUPS_SQL)
+    duplicate_groups = cursor.fetchone()[0]
+
+    print(f"Total files scanned:     {total_files}")
+    print(f"Duplicate groups found:  {duplicate_groups}")
+    print(f"Verified duplicates:     {total_duplicates}")
+    print(f"Originals kept:          {total_originals}")
+    print(f"Flagged for removal:     {flagged_for_removal}")
+    print(f"Space recoverable:       {space_recoverable_bytes / (1024*1024):.2f} MB")
+
+    # === SAMPLE DUPLICATE GROUPS ===
+    print()
+    print("Sample Duplicate Groups (largest first)")
+    print("-" * 60)
+
+    cursor.execute(SAMPLE_SQL)
+
+    # Iterate the cursor directly so rows stream via sqlite3_step instead of
+    # materializing the whole result set — large groups stay off the heap.
+    for (hash_val, group_size), rows in itertools.groupby(cursor, key=lambda r: (r[0], r[1])):
+        # normalized_hash is a signed 64-bit INTEGER; show it as hex
+        print(f"\nGroup {hash_val & 0xFFFFFFFFFFFFFFFF:016x}... ({group_size} files):")
+        # Truncation, MB formatting, and status text happen in SQL (substr,
+        # printf, CASE run in C); Python only picks the marker.
+        for _, _, relative_path, is_original, size_pretty, status in rows:
+            marker = "🟢" if is_original else "🔴"
+            print(f"  {marker} {relative_path} ({size_pretty}) - {status}")
+
+    print()
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    ensure_indexes(DB_PATH)
+    conn = open_readonly(DB_PATH)
+    print_report(conn)
+    conn.close()
@@ -0,0 +1,950 @@
+"""
+duplicate_detector.py
+Version 1.0 — Created by Sean P. Harrington with assistance from Microsoft Copilot
+
+General media duplicate detector for the NAS library. Finds exact duplicates
+(size + content hash, optionally re-verified), perceptual near-duplicates of images
+(phash/dhash/whash), and optionally visually similar images
+via OpenCV SSIM. Produces a text report plus a JSON results file.
+
+Requirements:
+    oby.cfg must be present in the same folder (supplies the default scan
+    directory; explicit directories can be given on the command line).
+    pip install Pillow numpy
+    pip install opencv-python scikit-image   (optional, for --opencv)
+    pip install xxhash                       (optional, faster grouping hash)
+
+Usage:
+    python duplicate_detector.py [dir ...] [--threshold 0.9] [--report] [--json]
+"""
+
+import os
+import json
+import mmap
+import sqlite3
+import hashlib
+import argparse
+import itertools
+import configparser
+from datetime import datetime
+from functools import partial
+from collections import defaultdict
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                as_completed)
+
+import numpy as np
+
+# Optional: perceptual hashing (Pillow; the hashes themselves are
+# computed in NumPy)
+try:
+    from PIL import Image
+    _HAVE_PIL = True
+except ImportError:
+    _HAVE_PIL = False
+
+# Optional: OpenCV visual comparison (SSIM itself is computed in NumPy)
+try:
+    import cv2
+    _HAVE_OPENCV = True
+except ImportError:
+    _HAVE_OPENCV = False
+
+# Optional: BLAKE3 (SIMD-accelerated, several times faster than SHA256)
+# for the verification hash; SHA256 is the fallback.
+try:
+    import blake3
+    _HAVE_BLAKE3 = True
+except ImportError:
+    _HAVE_BLAKE3 = False
+
+# Optional: xxhash gives XXH3-128 for the exact-dup grouping pre-pass —
+# an order of magnitude faster than MD5 and more than strong enough for
+# grouping, since matches are verifiable afterwards. MD5 is the fallback.
+try:
+    import xxhash
+    _HAVE_XXHASH = True
+except ImportError:
+    _HAVE_XXHASH = False
+
+# Optional: Numba compiles the fused pairwise popcount kernel to native
+# multi-core code; without it the banded NumPy path is used.
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# === LOAD CONFIG ===
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(__file__), "oby.cfg"))
+
+PHOTO_DIR = config.get("paths", "photo_dir")
+
+# === TIMESTAMPED LOG/REPORT PATHS ===
+timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+base_dir = os.path.dirname(os.path.abspath(__file__))
+report_folder = os.path.join(base_dir, config.get("logging", "report_folder"))
+os.makedirs(report_folder, exist_ok=True)
+REPORT_PATH = os.path.join(report_folder, f"detector_report_{timestamp}.txt")
+JSON_PATH = os.path.join(report_folder, f"detector_results_{timestamp}.json")
+
+# Persistent hash cache: reruns skip every file whose (size, mtime) is
+# unchanged, avoiding the IO and CPU entirely.
+CACHE_PATH = os.path.expanduser("~/.cache/nas_dedup.db")
+
+# Column order in the hashes cache table (after path, size, mtime).
+# 'group' lives in the column historically named md5; the stored value is
+# algorithm-prefixed (see _hash_file), so entries written with a different
+# grouping algorithm are simply recomputed rather than mismatched.
+_CACHE_COLS = {'group': 2, 'strong': 3, 'phash': 4, 'dhash': 5, 'whash': 6}
+
+
+def _to_signed64(value):
+    """Fit an unsigned 64-bit hash into SQLite's signed INTEGER."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_signed64(value):
+    return value + (1 << 64) if value < 0 else value
+
+# Per-byte popcount lookup table for vectorized Hamming distances
+_POPCOUNT_LUT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+if _HAVE_NUMBA:
+    @njit(cache=True)
+    def _popcount64(v):
+        # SWAR popcount; Numba lowers this to a handful of ALU ops
+        v = v - ((v >> 1) & 0x5555555555555555)
+        v = (v & 0x3333333333333333) + ((v >> 2) & 0x3333333333333333)
+        v = (v + (v >> 4)) & 0x0F0F0F0F0F0F0F0F
+        return (v * 0x0101010101010101) >> 56
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _fused_hamming(P, D, W, out):
+        """Fill the upper triangle of out with summed Hamming distances.
+
+        P, D, W: (N,) uint64 hash vectors; out: preallocated (N, N)
+        uint16. XOR, popcount, and the three-way sum fuse into one tiled
+        pass with rows parallelized via prange.
+        """
+        n = P.shape[0]
+        for i in prange(n):
+            for j in range(i + 1, n):
+                out[i, j] = (_popcount64(P[i] ^ P[j])
+                             + _popcount64(D[i] ^ D[j])
+                             + _popcount64(W[i] ^ W[j]))
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis matrix (n x n)."""
+    k = np.arange(n)[:, None]
+    m = np.arange(n)[None, :]
+    basis = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * m + 1) * k / (2 * n))
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _pack_bits(bits):
+    """Pack a boolean array into one big-endian Python int."""
+    return int.from_bytes(np.packbits(bits.reshape(-1)).tobytes(), 'big')
+
+
+def _perceptual_hashes(filepath):
+    """(phash, dhash, whash) as 64-bit ints, from a single decode.
+
+    imagehash.phash/dhash/whash each re-convert and re-resize the source
+    image, tripling the decode-adjacent work. Here the image is decoded
+    to grayscale once, and all three hashes are computed in NumPy:
+    - phash: low-frequency 8x8 corner of an orthonormal 2D DCT of the
+      32x32 reduction, thresholded at its median
+    - dhash: horizontal gradient sign on a 9x8 reduction
+    - whash: Haar approximation band (4x4 block means of the 32x32),
+      thresholded at its median
+    """
+    with Image.open(filepath) as img:
+        # For JPEGs, draft() decodes at reduced scale straight from the
+        # DCT coefficients — 4-64x less IDCT work; no-op otherwise.
+        try:
+            img.draft('L', (64, 64))
+        except Exception:
+            pass
+        gray = img.convert('L')
+        arr = np.asarray(gray.resize((32, 32), Image.Resampling.LANCZOS),
+                         dtype=np.float32)
+        small = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS),
+                           dtype=np.float32)
+    dct = _DCT32 @ arr @ _DCT32.T
+    low = dct[:8, :8]
+    phash = _pack_bits(low > np.median(low))
+    dhash = _pack_bits(small[:, 1:] > small[:, :-1])
+    blocks = arr.reshape(8, 4, 8, 4).mean(axis=(1, 3))
+    whash = _pack_bits(blocks > np.median(blocks))
+    return phash, dhash, whash
+
+
+def _phash_worker(filepath):
+    """Pool-safe wrapper: (path, phash, dhash, whash, error)."""
+    try:
+        return (filepath, *_perceptual_hashes(filepath), None)
+    except Exception as e:
+        return filepath, None, None, None, str(e)
+
+
+# Algorithm tags stored ahead of the grouping and strong digests (see
+# _hash_file): cached values written before/after an optional hasher was
+# installed must never cross-match fresh ones.
+_GROUP_PREFIX = 'xxh3:' if _HAVE_XXHASH else 'md5:'
+_STRONG_PREFIX = 'blake3:' if _HAVE_BLAKE3 else 'sha256:'
+_ALGO_PREFIXES = {'group': _GROUP_PREFIX, 'strong': _STRONG_PREFIX}
+
+# Whole-file mmap bounds: below 4 MiB a plain read wins; above 2 GiB the
+# mapping churns address space (and 32-bit builds) for no throughput gain.
+_MMAP_MIN = 4 * 1024 * 1024
+_MMAP_MAX = 2 * 1024 * 1024 * 1024
+
+# Files at least this large get their pages dropped from the page cache
+# after hashing (POSIX_FADV_DONTNEED): a hashed video is never read
+# again this run, and letting multi-GB files flush the cache evicts the
+# hot directory/dentry metadata the scan phase depends on.
+_DROP_CACHE_BYTES = 100 * 1024 * 1024
+
+
+def _hash_file(filepath, algorithm='group'):
+    """Hash a file's contents; module-level (picklable) for worker pools.
+
+    'group' is the exact-dup grouping digest: XXH3-128 when xxhash is
+    installed (multi-GB/s with SIMD — plenty for a grouping step whose
+    matches can be re-verified), else MD5. 'strong' selects BLAKE3 when
+    installed, else SHA256. Both hexdigests are prefixed with the
+    algorithm name so cached values from before an optional-hasher
+    install never cross-match fresh ones. Mid-size files are mmap'd and fed to the hasher in one
+    zero-copy update; otherwise hashlib.file_digest (Python 3.11+) runs
+    the read loop in C with no Python-level chunk objects, and the last
+    fallback reads 1 MiB chunks. posix_fadvise(SEQUENTIAL) hints the
+    kernel to read ahead, and large files get POSIX_FADV_DONTNEED after
+    hashing — each is read exactly once, so there is no reason to let
+    them flush hotter data out of the page cache.
+    """
+    prefix = ''
+    if algorithm == 'group':
+        factory = xxhash.xxh3_128 if _HAVE_XXHASH else hashlib.md5
+        prefix = _GROUP_PREFIX
+    elif algorithm == 'strong':
+        factory = blake3.blake3 if _HAVE_BLAKE3 else hashlib.sha256
+        prefix = _STRONG_PREFIX
+    else:
+        factory = partial(hashlib.new, algorithm)
+    with open(filepath, 'rb') as f:
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except (AttributeError, OSError):
+            pass
+        size = os.fstat(f.fileno()).st_size
+        if _MMAP_MIN <= size < _MMAP_MAX:
+            hasher = factory()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                hasher.update(m)
+        elif hasattr(hashlib, 'file_digest'):
+            hasher = hashlib.file_digest(f, factory)
+        else:
+            hasher = factory()
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(chunk)
+        if size >= _DROP_CACHE_BYTES:
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            except (AttributeError, OSError):
+                pass
+        return prefix + hasher.hexdigest()
+
+
+def _files_equal(path1, path2):
+    """Byte-for-byte compare over paired 1 MiB reads.
+
+    Stops at the first differing block, so unequal files cost kilobytes
+    of IO. filecmp.cmp would do the same job in 8 KiB reads — hundreds
+    of round trips per file over SMB where latency dwarfs bandwidth —
+    and grows its module-level result cache unbounded across a scan.
+    Callers have already matched sizes, so only content is checked.
+    """
+    with open(path1, 'rb') as f1, open(path2, 'rb') as f2:
+        while True:
+            chunk1 = f1.read(1 << 20)
+            if chunk1 != f2.read(1 << 20):
+                return False
+            if not chunk1:
+                return True
+
+
+# Bytes sampled from each end of a file for the quick fingerprint
+_PREFIX_BYTES = 65536
+
+
+def _quick_fingerprint(filepath):
+    """Digest of the first and last 64 KiB of a file.
+
+    A cheap pre-filter for size-collision groups: two multi-GB videos
+    that differ anywhere near either end separate after 128 KiB of IO
+    instead of two full-file reads (MP4/MOV trailers make the tail
+    sample especially effective). Only files still colliding on
+    (size, quick fingerprint) proceed to full hashing.
+    """
+    digest = blake3.blake3() if _HAVE_BLAKE3 else hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        digest.update(f.read(_PREFIX_BYTES))
+        size = os.fstat(f.fileno()).st_size
+        if size > 2 * _PREFIX_BYTES:
+            f.seek(-_PREFIX_BYTES, os.SEEK_END)
+            digest.update(f.read(_PREFIX_BYTES))
+    return digest.hexdigest()
+
+
+class DuplicateGroup:
+    """One set of files considered duplicates of each other."""
+
+    def __init__(self, files, method, similarity=1.0):
+        self.files = files          # list of file paths
+        self.method = method        # 'exact', 'near', or 'ssim'
+        self.similarity = similarity
+        self.keep = None            # recommended original
+        self.remove = []            # recommended removals
+
+
+class MediaDuplicateDetector:
+    """Scans directories and finds duplicate media files."""
+
+    IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp',
+                                  '.tiff', '.tif', '.webp', '.heic', '.heif'})
+    VIDEO_EXTENSIONS = frozenset({'.mp4', '.mov', '.avi', '.mkv', '.m4v',
+                                  '.mpg', '.mpeg', '.wmv', '.3gp', '.mts'})
+    MEDIA_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+
+    def __init__(self, directories, similarity_threshold=0.9, hash_workers=16,
+                 cache_path=CACHE_PATH, paranoid=False):
+        self.directories = directories
+        self.similarity_threshold = similarity_threshold
+        self.paranoid = paranoid
+        # Hashing over SMB is latency-bound, not CPU-bound, and hashlib
+        # releases the GIL while digesting, so threads suffice to keep
+        # the NAS queue full.
+        self.hash_workers = hash_workers
+        # Structure-of-arrays file metadata: a namedtuple per file costs
+        # ~200 bytes of Python object overhead; parallel NumPy arrays
+        # cost 16 bytes per file and let size-grouping run vectorized.
+        self.paths = []             # index -> path
+        self._index = {}            # path -> index
+        self._size_list = []
+        self._mtime_list = []
+        self.sizes = np.empty(0, dtype=np.int64)
+        self.mtimes = np.empty(0, dtype=np.float64)
+        self._scores = np.empty(0, dtype=np.float64)
+        self._init_cache(cache_path)
+
+    def _add_file(self, filepath, size, mtime):
+        self._index[filepath] = len(self.paths)
+        self.paths.append(filepath)
+        self._size_list.append(size)
+        self._mtime_list.append(mtime)
+
+    def _finalize_arrays(self):
+        self.sizes = np.array(self._size_list, dtype=np.int64)
+        self.mtimes = np.array(self._mtime_list, dtype=np.float64)
+        # Keep-scores for every file, computed once from scan metadata:
+        # prefer larger, then older, then standard formats, then shorter
+        # paths. Scoring a group is then a single vectorized argmax with
+        # no per-file stat or suffix parsing.
+        jpeg_bonus = np.fromiter(
+            (10.0 if f[f.rfind('.'):].lower() in ('.jpg', '.jpeg') else 0.0
+             for f in self.paths), dtype=np.float64, count=len(self.paths))
+        path_lens = np.fromiter((len(f) for f in self.paths),
+                                dtype=np.float64, count=len(self.paths))
+        self._scores = (self.sizes / (1024 * 1024)
+                        + (self.mtimes - 1e9) / 1e5
+                        + jpeg_bonus - path_lens / 100)
+
+    def _size_of(self, filepath):
+        return int(self.sizes[self._index[filepath]])
+
+    def _mtime_of(self, filepath):
+        return float(self.mtimes[self._index[filepath]])
+
+    # === PERSISTENT HASH CACHE ===
+
+    def _init_cache(self, cache_path):
+        """Open (creating if needed) the persistent hash cache."""
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.cache = sqlite3.connect(cache_path)
+        # WAL + relaxed sync make the end-of-phase batch insert cheap.
+        self.cache.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                md5 TEXT,
+                strong TEXT,
+                phash INTEGER,
+                dhash INTEGER,
+                whash INTEGER
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_hashes_size_md5 ON hashes(size, md5);
+        """)
+        self._cached = {row[0]: row[1:] for row in self.cache.execute(
+            "SELECT path, size, mtime, md5, strong, phash, dhash, whash FROM hashes")}
+        self._dirty = {}            # path -> {column: value}
+
+    def _cache_get(self, filepath, column):
+        """Cached value for a file, or None if stat changed or missing."""
+        row = self._cached.get(filepath)
+        if row is None or filepath not in self._index:
+            return None
+        if (row[0], row[1]) != (self._size_of(filepath), self._mtime_of(filepath)):
+            return None
+        return row[_CACHE_COLS[column]]
+
+    def _cache_put(self, filepath, column, value):
+        self._dirty.setdefault(filepath, {})[column] = value
+
+    def _flush_cache(self):
+        """Write pending cache entries in one batched transaction."""
+        if not self._dirty:
+            return
+        rows = []
+        for filepath, values in self._dirty.items():
+            size, mtime = self._size_of(filepath), self._mtime_of(filepath)
+            old = self._cached.get(filepath)
+            # Carry old columns forward only if they match the current stat
+            if old is None or (old[0], old[1]) != (size, mtime):
+                old = (size, mtime, None, None, None, None, None)
+            merged = list(old)
+            for column, value in values.items():
+                merged[_CACHE_COLS[column]] = value
+            merged[0], merged[1] = size, mtime
+            self._cached[filepath] = tuple(merged)
+            rows.append((filepath, *merged))
+        with self.cache:
+            self.cache.executemany(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+        self._dirty.clear()
+
+    def log(self, message):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+
+    # === SCANNING ===
+
+    # Suffix checks run once per directory entry on million-file scans;
+    # a raw-string rfind + frozenset lookup avoids allocating and parsing
+    # a PurePath per file.
+
+    def _is_image_file(self, filepath):
+        i = filepath.rfind('.')
+        return i >= 0 and filepath[i:].lower() in self.IMAGE_EXTENSIONS
+
+    def _is_video_file(self, filepath):
+        i = filepath.rfind('.')
+        return i >= 0 and filepath[i:].lower() in self.VIDEO_EXTENSIONS
+
+    def _is_media_file(self, filepath):
+        i = filepath.rfind('.')
+        return i >= 0 and filepath[i:].lower() in self.MEDIA_EXTENSIONS
+
+    def scan_directories(self):
+        """Collect all media files under the configured directories.
+
+        Walks with os.scandir: DirEntry objects answer is_dir/is_file and
+        stat from fields cached during the directory read, so each file
+        costs one directory entry instead of the extra stat round trips
+        os.walk + os.stat issued — on NAS mounts every stat is a network
+        RPC. The metadata arrays are populated straight from the cached
+        stat, so nothing downstream ever stats a scanned file again.
+        """
+        media_files = []
+        for directory in self.directories:
+            self.log(f"[SCAN] {directory}")
+            stack = [directory]
+            while stack:
+                current = stack.pop()
+                try:
+                    with os.scandir(current) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                # Skip Synology system directories
+                                if not entry.name.startswith('@'):
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False) and \
+                                    self._is_media_file(entry.name):
+                                try:
+                                    st = entry.stat(follow_symlinks=False)
+                                except OSError as e:
+                                    self.log(f"[ERROR] Cannot stat {entry.path}: {e}")
+                                    continue
+                                self._add_file(entry.path, st.st_size, st.st_mtime)
+                                media_files.append(entry.path)
+                except OSError as e:
+                    self.log(f"[ERROR] Cannot scan {current}: {e}")
+        self._finalize_arrays()
+        self.log(f"[SCAN] Found {len(media_files)} media files")
+        return media_files
+
+    # === EXACT DUPLICATES ===
+
+    def get_file_hash(self, filepath, algorithm='group'):
+        """Hash a file's contents."""
+        return _hash_file(filepath, algorithm)
+
+    def _map_files(self, worker, files):
+        """Run worker over files concurrently; returns path -> result.
+
+        Sequential hashing leaves the NAS idle between requests; a
+        thread pool keeps multiple reads in flight and hashes them as
+        they arrive. Failed files are logged and left out of the map.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.hash_workers) as executor:
+            futures = {executor.submit(worker, f): f for f in files}
+            for future in as_completed(futures):
+                filepath = futures[future]
+                try:
+                    results[filepath] = future.result()
+                except OSError as e:
+                    self.log(f"[ERROR] Cannot hash {filepath}: {e}")
+        return results
+
+    def _hash_many(self, files, algorithm):
+        """Hash files concurrently; returns path -> hexdigest.
+
+        Files whose (size, mtime) match a cached row are served from the
+        persistent cache without any IO; fresh results are queued for the
+        end-of-phase batch write.
+        """
+        column = algorithm if algorithm in _CACHE_COLS else None
+        results = {}
+        to_hash = []
+        expected_prefix = _ALGO_PREFIXES.get(algorithm)
+        for filepath in files:
+            cached = self._cache_get(filepath, column) if column else None
+            # A digest from a different algorithm (cache written
+            # before/after xxhash or blake3 was installed) is
+            # recomputed, not reused.
+            if (expected_prefix is not None and cached is not None
+                    and not cached.startswith(expected_prefix)):
+                cached = None
+            if cached is not None:
+                results[filepath] = cached
+            else:
+                to_hash.append(filepath)
+        fresh = self._map_files(partial(_hash_file, algorithm=algorithm), to_hash)
+        if column:
+            for filepath, digest in fresh.items():
+                self._cache_put(filepath, column, digest)
+        results.update(fresh)
+        return results
+
+    def find_exact_duplicates(self, media_files):
+        """Group bit-identical files: size, then content hash (+ verify).
+
+        Size-collision candidates come from one vectorized pass over the
+        sizes array (np.unique + counts) instead of building a Python
+        dict of lists per size.
+        """
+        idx = np.fromiter((self._index[f] for f in media_files),
+                          dtype=np.intp, count=len(media_files))
+        sizes = self.sizes[idx]
+        _, inverse, counts = np.unique(sizes, return_inverse=True,
+                                       return_counts=True)
+        dup_mask = (counts[inverse] > 1) & (sizes > 0)
+        candidates = [media_files[i] for i in np.nonzero(dup_mask)[0]]
+
+        # Each stage groups by sorting flat (key..., path) tuples and
+        # scanning with groupby — one linear pass over contiguous tuples
+        # instead of nested defaultdicts churning per-file inserts.
+        def collisions(keyed_entries, key_width):
+            survivors = []
+            keyed_entries.sort()
+            for _, grp in itertools.groupby(keyed_entries,
+                                            key=lambda t: t[:key_width]):
+                grp = [t[-1] for t in grp]
+                if len(grp) >= 2:
+                    survivors.append(grp)
+            return survivors
+
+        # Two-file size groups skip hashing altogether: a byte compare
+        # stops at the first differing block, so differing files cost
+        # kilobytes of IO instead of two full-file hashes, and identical
+        # files cost the same single read each.
+        groups = []
+        size_groups = collisions([(self._size_of(f), f) for f in candidates], 1)
+        candidates = []
+        for grp in size_groups:
+            if len(grp) == 2:
+                try:
+                    if _files_equal(grp[0], grp[1]):
+                        group = DuplicateGroup(grp, 'exact')
+                        self._recommend_action(group)
+                        groups.append(group)
+                    continue
+                except OSError as e:
+                    self.log(f"[ERROR] Cannot compare {grp[0]}: {e}")
+                    continue
+            candidates.extend(grp)
+
+        # Quick head/tail fingerprint first: only files still colliding
+        # afterwards pay for a full-file read.
+        quick_of = self._map_files(_quick_fingerprint, candidates)
+        full_candidates = [f for grp in collisions(
+            [(self._size_of(f), quick_of[f], f) for f in candidates
+             if f in quick_of], 2) for f in grp]
+
+        hash_of = self._hash_many(full_candidates, 'group')
+        hash_groups = collisions(
+            [(self._size_of(f), hash_of[f], f) for f in full_candidates
+             if f in hash_of], 2)
+
+        # A size + content-hash match is definitive for non-adversarial
+        # media (collision odds ~2^-64 within a size group); the second
+        # full-file verification read doubled the phase's IO. --paranoid
+        # re-enables it with the strong hash.
+        if self.paranoid:
+            verify_files = [f for grp in hash_groups for f in grp]
+            strong_of = self._hash_many(verify_files, 'strong')
+            hash_groups = collisions(
+                [(self._size_of(f), hash_of[f], strong_of[f], f)
+                 for f in verify_files if f in strong_of], 3)
+
+        for verified in hash_groups:
+            group = DuplicateGroup(verified, 'exact')
+            self._recommend_action(group)
+            groups.append(group)
+        self._flush_cache()
+        return groups
+
+    # === NEAR DUPLICATES (PERCEPTUAL) ===
+
+    def find_near_duplicates(self, media_files):
+        """Find perceptually similar images via phash/dhash/whash.
+
+        Candidate generation uses multi-index bucketing instead of an
+        all-pairs sweep: each 64-bit phash is split into four 16-bit
+        bands, and two hashes within Hamming distance 3 must (pigeonhole)
+        collide in at least one band, so only band-collision candidates
+        get the full distance check. That check is still vectorized —
+        batched XOR + popcount-LUT over the packed uint64 arrays — and
+        similarity is the mean over the three hash types (192 bits), so
+        the search is near-linear on real photo sets instead of O(N^2).
+        """
+        if not _HAVE_PIL:
+            self.log("[NEAR] Pillow not available, skipping")
+            return []
+
+        image_files = [f for f in media_files if self._is_image_file(f)]
+        paths = []
+        phashes, dhashes, whashes = [], [], []
+        to_compute = []
+        for filepath in image_files:
+            cached = self._cache_get(filepath, 'phash')
+            if cached is not None:
+                phashes.append(_from_signed64(cached))
+                dhashes.append(_from_signed64(self._cache_get(filepath, 'dhash')))
+                whashes.append(_from_signed64(self._cache_get(filepath, 'whash')))
+                paths.append(filepath)
+            else:
+                to_compute.append(filepath)
+
+        # Decode + DCT is CPU-bound per image and trivially data-parallel;
+        # a process pool sidesteps the GIL, with chunksize amortizing IPC.
+        if to_compute:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for filepath, p, d, w, error in executor.map(
+                        _phash_worker, to_compute, chunksize=32):
+                    if error is not None:
+                        self.log(f"[WARN] Cannot hash image {filepath}: {error}")
+                        continue
+                    phashes.append(p)
+                    dhashes.append(d)
+                    whashes.append(w)
+                    paths.append(filepath)
+                    self._cache_put(filepath, 'phash', _to_signed64(p))
+                    self._cache_put(filepath, 'dhash', _to_signed64(d))
+                    self._cache_put(filepath, 'whash', _to_signed64(w))
+        self._flush_cache()
+
+        if len(paths) < 2:
+            return []
+
+        P = np.array(phashes, dtype=np.uint64)
+        D = np.array(dhashes, dtype=np.uint64)
+        W = np.array(whashes, dtype=np.uint64)
+
+        # Numba kernel when available: fused XOR + SWAR popcount +
+        # three-way sum, rows across all cores. Bounded to ~16k images so
+        # the (N, N) distance matrix stays small; larger sets use the
+        # banded candidate search below.
+        if _HAVE_NUMBA and len(paths) <= 16384:
+            out = np.zeros((len(paths), len(paths)), dtype=np.uint16)
+            _fused_hamming(P, D, W, out)
+            sim = 1.0 - out / 192.0
+            pairs = [(paths[i], paths[j], float(sim[i, j]))
+                     for i, j in zip(*np.nonzero(
+                         np.triu(sim >= self.similarity_threshold, k=1)))]
+            return self._pairs_to_groups(pairs)
+
+        pv = P.view(np.uint8).reshape(-1, 8)
+        dv = D.view(np.uint8).reshape(-1, 8)
+        wv = W.view(np.uint8).reshape(-1, 8)
+
+        bands = [defaultdict(list) for _ in range(4)]
+        for idx, h in enumerate(phashes):
+            for b in range(4):
+                bands[b][(h >> (16 * b)) & 0xFFFF].append(idx)
+
+        pairs = []
+        for i, h in enumerate(phashes):
+            candidates = set()
+            for b in range(4):
+                candidates.update(bands[b][(h >> (16 * b)) & 0xFFFF])
+            cand = np.array([j for j in candidates if j > i], dtype=np.intp)
+            if cand.size == 0:
+                continue
+            total = (_POPCOUNT_LUT[pv[i] ^ pv[cand]].sum(axis=1, dtype=np.uint16)
+                     + _POPCOUNT_LUT[dv[i] ^ dv[cand]].sum(axis=1)
+                     + _POPCOUNT_LUT[wv[i] ^ wv[cand]].sum(axis=1))
+            sim = 1.0 - total / 192.0
+            keep = sim >= self.similarity_threshold
+            for j, s in zip(cand[keep], sim[keep]):
+                pairs.append((paths[i], paths[j], float(s)))
+        return self._pairs_to_groups(pairs)
+
+    # === VISUAL SIMILARITY (OPENCV) ===
+
+    def find_opencv_duplicates(self, media_files):
+        """Compare images pairwise with SSIM on 64x64 grayscale.
+
+        All images are stacked into one (N, 4096) float32 matrix and the
+        pairwise SSIM (global-statistics form: whole-image means,
+        variances, and covariances) is computed with BLAS matmuls in row
+        tiles — the covariance of every pair is one flat @ flat.T away —
+        instead of N^2 Python-level skimage calls. 64x64 is plenty for
+        duplicate screening; SSIM is scale-tolerant and 256x256 was 16x
+        the pixel work.
+        """
+        if not _HAVE_OPENCV:
+            self.log("[SSIM] OpenCV/scikit-image not available, skipping")
+            return []
+
+        image_files = [f for f in media_files if self._is_image_file(f)]
+
+        def _load(filepath):
+            # REDUCED_GRAYSCALE_8 lets libjpeg downsample 1/8 during
+            # decode — 64x less pixel work than decoding full size and
+            # resizing afterwards; fall back for formats without it.
+            img = cv2.imread(filepath, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if img is None:
+                img = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+            return None if img is None else cv2.resize(img, (64, 64))
+
+        # OpenCV releases the GIL inside imread/resize, so a thread pool
+        # overlaps decode with the NAS reads; each result lands straight
+        # in its preallocated row, giving one contiguous block for the
+        # matmuls below instead of a list of per-image arrays.
+        stack = np.empty((len(image_files), 64, 64), dtype=np.uint8)
+        valid = np.zeros(len(image_files), dtype=bool)
+        with ThreadPoolExecutor(max_workers=self.hash_workers) as executor:
+            for i, img in enumerate(executor.map(_load, image_files)):
+                if img is not None:
+                    stack[i] = img
+                    valid[i] = True
+        paths = [f for f, ok in zip(image_files, valid) if ok]
+        if len(paths) < 2:
+            return []
+
+        flat = stack[valid].astype(np.float32).reshape(len(paths), -1)
+        npix = flat.shape[1]
+        mu = flat.mean(axis=1)
+        var = flat.var(axis=1)
+        c1 = (0.01 * 255) ** 2
+        c2 = (0.03 * 255) ** 2
+
+        pairs = []
+        # Tile the pair matrix so the cross-covariance block stays small.
+        for start in range(0, len(paths), 512):
+            stop = min(start + 512, len(paths))
+            cov = flat[start:stop] @ flat.T / npix - np.outer(mu[start:stop], mu)
+            num = (2 * np.outer(mu[start:stop], mu) + c1) * (2 * cov + c2)
+            den = ((mu[start:stop, None] ** 2 + mu[None, :] ** 2 + c1)
+                   * (var[start:stop, None] + var[None, :] + c2))
+            sim = num / den
+            for i_local, j in np.argwhere(sim >= self.similarity_threshold):
+                i = start + i_local
+                if i < j:
+                    pairs.append((paths[i], paths[j], float(sim[i_local, j])))
+        return self._pairs_to_groups(pairs, method='ssim')
+
+    def _pairs_to_groups(self, pairs, method='near'):
+        """Merge similar pairs into connected groups."""
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        similarity = {}
+        for path1, path2, sim in pairs:
+            root1, root2 = find(path1), find(path2)
+            if root1 != root2:
+                parent[root2] = root1
+            root = find(path1)
+            similarity[root] = min(similarity.get(root, 1.0), sim)
+
+        members = defaultdict(list)
+        for path in parent:
+            members[find(path)].append(path)
+
+        groups = []
+        for root, files in members.items():
+            if len(files) > 1:
+                group = DuplicateGroup(sorted(files), method,
+                                       similarity.get(root, 1.0))
+                self._recommend_action(group)
+                groups.append(group)
+        return groups
+
+    # === RECOMMENDATIONS ===
+
+    def score_file(self, filepath):
+        """Higher score = better candidate to keep (precomputed at scan)."""
+        return float(self._scores[self._index[filepath]])
+
+    def _recommend_action(self, group):
+        """Pick which file to keep based on the precomputed scores."""
+        idx = np.fromiter((self._index[f] for f in group.files),
+                          dtype=np.intp, count=len(group.files))
+        best = group.files[int(np.argmax(self._scores[idx]))]
+        group.keep = best
+        group.remove = [f for f in group.files if f != best]
+
+    # === REPORTING ===
+
+    def generate_report(self, all_groups):
+        """Write the text report and JSON results.
+
+        Both files are streamed group by group instead of materializing
+        one giant string (or dict) first, so memory stays flat no matter
+        how many groups a scan produces and output appears immediately.
+        The buffered file object coalesces the per-line writes.
+        """
+        total_wasted = 0
+        with open(REPORT_PATH, "w", encoding="utf-8") as report:
+            print("Media Duplicate Report", file=report)
+            print("======================", file=report)
+            print(file=report)
+            for group in all_groups:
+                print(f"Group ({group.method}, similarity >= "
+                      f"{group.similarity:.2f}): {len(group.files)} files",
+                      file=report)
+                for filepath in group.files:
+                    # Sizes and mtimes come from the scan-time arrays —
+                    # no stat round trips just to format the report.
+                    size = self._size_of(filepath)
+                    mtime = datetime.fromtimestamp(
+                        self._mtime_of(filepath)).strftime('%Y-%m-%d')
+                    marker = "KEEP  " if filepath == group.keep else "REMOVE"
+                    print(f"  [{marker}] {filepath} "
+                          f"({size / (1024 * 1024):.2f} MB, {mtime})",
+                          file=report)
+                    if filepath != group.keep:
+                        total_wasted += size
+                print(file=report)
+            print("-" * 30, file=report)
+            print(f"Recoverable space: {total_wasted / (1024*1024):.2f} MB",
+                  file=report)
+        self.log(f"[REPORT] Written to: {REPORT_PATH}")
+
+        # JSON is streamed the same way: header, then one json.dumps per
+        # group (each a few hundred bytes), then the closing brackets.
+        with open(JSON_PATH, "w", encoding="utf-8") as fp:
+            fp.write('{"generated": %s,\n "groups": [\n'
+                     % json.dumps(datetime.now().isoformat()))
+            for i, group in enumerate(all_groups):
+                fp.write(',\n' if i else '')
+                fp.write(json.dumps({
+                    "method": group.method,
+                    "similarity": group.similarity,
+                    "keep": group.keep,
+                    "remove": group.remove,
+                    "files": group.files,
+                }))
+            fp.write('\n]}\n')
+        self.log(f"[REPORT] JSON written to: {JSON_PATH}")
+
+    # === ORCHESTRATION ===
+
+    def detect_all_duplicates(self, use_opencv=False):
+        """Run the full detection pipeline and return all groups."""
+        media_files = self.scan_directories()
+
+        exact_groups = self.find_exact_duplicates(media_files)
+        self.log(f"[EXACT] {len(exact_groups)} exact duplicate groups")
+
+        near_groups = self.find_near_duplicates(media_files)
+        self.log(f"[NEAR] {len(near_groups)} near duplicate groups")
+
+        ssim_groups = []
+        if use_opencv:
+            ssim_groups = self.find_opencv_duplicates(media_files)
+            self.log(f"[SSIM] {len(ssim_groups)} visually similar groups")
+
+        all_groups = exact_groups + near_groups + ssim_groups
+
+        # Cached sizes from the scan; every path was valid then, so there is
+        # no os.path.exists pre-check (any later access is wrapped instead).
+        space_wasted = sum(self._size_of(filepath)
+                           for group in all_groups
+                           for filepath in group.remove)
+        self.log(f"[DONE] {len(all_groups)} groups, "
+                 f"{space_wasted / (1024*1024):.2f} MB recoverable")
+        return all_groups
+
+
+# === MAIN FUNCTION ===
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Media Duplicate Detector v1.0 - Finds exact, perceptual, "
+                    "and visually similar duplicates")
+    parser.add_argument("directories", nargs="*", default=None,
+                        help=f"Directories to scan (default: {PHOTO_DIR})")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="Similarity threshold, 0..1 (default 0.9)")
+    parser.add_argument("--opencv", action="store_true",
+                        help="Also run the OpenCV SSIM comparison")
+    parser.add_argument("--report", action="store_true",
+                        help="Write text and JSON reports to the reports folder")
+    parser.add_argument("--paranoid", action="store_true",
+                        help="Re-verify hash matches with a second strong hash")
+    args = parser.parse_args()
+
+    directories = args.directories or [PHOTO_DIR]
+    detector = MediaDuplicateDetector(directories,
+                                      similarity_threshold=args.threshold,
+                                      paranoid=args.paranoid)
+    detector.log("=" * 50)
+    detector.log("Media Duplicate Detector v1.0")
+    detector.log("=" * 50)
+
+    all_groups = detector.detect_all_duplicates(use_opencv=args.opencv)
+
+    if args.report:
+        detector.generate_report(all_groups)
+
+
+if __name__ == "__main__":
+    main()
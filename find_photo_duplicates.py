@@ -0,0 +1,800 @@
+"""
+find_photo_duplicates.py
+Version 1.0 — Created by Sean P. Harrington with assistance from Microsoft Copilot
+
+Scans the sorted photo library, fingerprints every image, and reports exact
+and near duplicates. Fingerprints are cached in a SQLite database
+(photo_hashes.db) alongside the sorted photos so repeat runs only process
+new or changed files.
+
+Three fingerprints are stored per image:
+- BLAKE2b-128 of the file bytes, for exact (bit-identical) duplicate detection
+- BLAKE2b of a normalized 64x64 thumbnail, for exact pixel-content matches
+- A 64-bit perceptual dHash (phash64), for near-duplicate detection
+
+Near-duplicate search uses multi-index hashing over phash64: the 64-bit
+hash is split into four 16-bit bands, and any two hashes within Hamming
+distance 3 are guaranteed (by pigeonhole) to collide in at least one band,
+so only band-collision candidates need a full distance check. This keeps
+the search close to O(N) instead of comparing all pairs.
+
+Requirements:
+    oby.cfg must be present in the same folder.
+    pip install Pillow numpy
+
+Usage:
+    python find_photo_duplicates.py [--threshold 0.9] [--report] [--force] [--limit N]
+"""
+
+import io
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import argparse
+import itertools
+import configparser
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                as_completed, wait)
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Optional: Numba compiles the batched Hamming kernel to native
+# multi-core code; without it the NumPy row-at-a-time path is used.
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# === LOAD CONFIG ===
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(__file__), "oby.cfg"))
+
+PHOTO_DIR = config.get("paths", "photo_dir")
+
+# Per-byte popcount lookup table for vectorized Hamming distances
+_POPCOUNT_LUT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Lazy %s formatting defers interpolation (and the formatter defers the
+# timestamp) until a handler actually emits the record, so disabled
+# levels cost one level check on the hot paths. Handlers are attached
+# in main(); library use gets the stdlib NullHandler default.
+logger = logging.getLogger(__name__)
+
+# Compiled once: extract_year_from_path runs once per file inside the
+# hashing loop, so it must not pay a re-compile-cache lookup per call.
+_YEAR_RE = re.compile(r'(\d{4})\s*-\s*Photos', re.IGNORECASE)
+_FOLDER_RE = re.compile(r'^\d{4}\s*-\s*Photos$', re.IGNORECASE)
+
+if _HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _all_pairs_hamming(H, pop, out):
+        """Fill the upper triangle of out with pairwise Hamming distances.
+
+        H: (N, 32) uint8 hash matrix, pop: 256-entry popcount LUT,
+        out: preallocated (N, N) uint16. Rows run in parallel via prange.
+        """
+        n = H.shape[0]
+        for i in prange(n):
+            for j in range(i + 1, n):
+                d = 0
+                for k in range(H.shape[1]):
+                    d += pop[H[i, k] ^ H[j, k]]
+                out[i, j] = d
+
+
+_INSERT_SQL = """INSERT OR REPLACE INTO photo_hashes
+                 (folder_id, filename, file_size, file_mtime, blake_hash,
+                  normalized_hash, phash64, first_seen, last_processed, year)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+# === WORKER FUNCTIONS ===
+# Module-level (picklable) so ProcessPoolExecutor can run them in
+# worker processes; decode + resize + hash is CPU-bound per file.
+
+def _file_blake(file_path):
+    """BLAKE2b-128 of the raw file bytes, as a 16-byte digest.
+
+    BLAKE2b hashes faster than MD5 on modern CPUs, and the raw 16-byte
+    BLOB halves what the hex TEXT column used to store and index.
+    hashlib.file_digest (Python 3.11+) reads in optimally-sized chunks
+    entirely in C; the fallback uses 1 MiB reads — 4 KiB chunks meant
+    hundreds of round trips per file over SMB, where per-operation
+    latency dwarfs bandwidth.
+    """
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(
+                f, lambda: hashlib.blake2b(digest_size=16)).digest()
+        h = hashlib.blake2b(digest_size=16)
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+        return h.digest()
+
+
+def _normalized_hashes(source, thumbnail_size):
+    """Content fingerprints: (normalized BLAKE2b, 64-bit dHash).
+
+    source may be a path or a file-like object (BytesIO from the fused
+    read path below).
+    """
+    with Image.open(source) as img:
+        # For JPEGs, draft() decodes at 1/2, 1/4, or 1/8 scale straight
+        # from the DCT coefficients — far less IDCT work and fewer bytes
+        # read. It's a no-op for other formats.
+        try:
+            img.draft('RGB', (thumbnail_size * 2, thumbnail_size * 2))
+        except Exception:
+            pass
+        img = img.convert('RGB')
+
+        # Integer box-filter reduce first (near-free), then a small
+        # BILINEAR fit. LANCZOS sharpness would be discarded by the 6-bit
+        # quantization below anyway. Note ImageOps.fit center-crops to
+        # preserve aspect ratio — it does not letterbox.
+        factor = max(1, min(img.size) // (thumbnail_size * 2))
+        if factor > 1:
+            img = img.reduce(factor)
+        img_resized = ImageOps.fit(
+            img, (thumbnail_size, thumbnail_size),
+            method=Image.Resampling.BILINEAR)
+
+        # Uniform 6-bit-per-channel quantization to reduce sensitivity to
+        # JPEG noise. Unlike median-cut this is deterministic — two
+        # perceptually identical images always quantize to the same bytes
+        # — and it's a single masked copy instead of a palette search.
+        pixel_data = (np.asarray(img_resized, dtype=np.uint8) & 0xFC).tobytes()
+        normalized_hash = hashlib.blake2b(pixel_data, digest_size=16).digest()
+
+        # 64-bit dHash: sign of horizontal differences on a 9x8
+        # grayscale reduction, packed into 8 bytes.
+        gray = img_resized.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+        arr = np.asarray(gray, dtype=np.int16)
+        diff_bits = (arr[:, 1:] > arr[:, :-1]).reshape(-1)
+        phash64 = int.from_bytes(np.packbits(diff_bits).tobytes(),
+                                 'big', signed=True)
+        return normalized_hash, phash64
+
+
+# Above this size, read streaming instead of buffering the whole file
+_BUFFER_LIMIT = 200 * 1024 * 1024
+
+
+def _hash_one(file_path, thumbnail_size):
+    """Fingerprint one file; returns (path, blake, nhash, phash64, error).
+
+    Reads the file from the NAS exactly once: the bytes are buffered,
+    hashed, and the same buffer is handed to Pillow — previously the file
+    hash and the image decode each pulled the full file over the wire.
+    Very large files fall back to the two-pass streaming path to bound
+    memory.
+    """
+    try:
+        if os.path.getsize(file_path) > _BUFFER_LIMIT:
+            blake_hash = _file_blake(file_path)
+            normalized_hash, phash64 = _normalized_hashes(file_path, thumbnail_size)
+        else:
+            with open(file_path, 'rb') as f:
+                buf = f.read()
+            blake_hash = hashlib.blake2b(buf, digest_size=16).digest()
+            normalized_hash, phash64 = _normalized_hashes(io.BytesIO(buf), thumbnail_size)
+        return file_path, blake_hash, normalized_hash, phash64, None
+    except Exception as e:
+        return file_path, None, None, None, str(e)
+
+# === TIMESTAMPED LOG/REPORT PATHS ===
+timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+base_dir = os.path.dirname(os.path.abspath(__file__))
+log_folder = os.path.join(base_dir, config.get("logging", "log_folder"))
+report_folder = os.path.join(base_dir, config.get("logging", "report_folder"))
+os.makedirs(log_folder, exist_ok=True)
+os.makedirs(report_folder, exist_ok=True)
+LOG_PATH = os.path.join(log_folder, f"duplicates_log_{timestamp}.txt")
+REPORT_PATH = os.path.join(report_folder, f"duplicates_report_{timestamp}.txt")
+
+
+class DuplicateGroup:
+    """One set of files considered duplicates of each other."""
+
+    def __init__(self, hash_value, files, method):
+        self.hash_value = hash_value
+        self.files = files          # list of file paths
+        self.method = method        # 'exact' or 'near'
+        self.keep = None            # recommended original
+        self.remove = []            # recommended removals
+        self.similarity = 1.0
+
+
+class PhotoDuplicateDetector:
+    """Builds the fingerprint database and finds duplicate photos."""
+
+    IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff',
+                        '.tif', '.webp', '.heic', '.heif'}
+
+    def __init__(self, photo_dir, thumbnail_size=64):
+        self.photo_dir = photo_dir
+        self.thumbnail_size = thumbnail_size
+        self.db_path = os.path.join(photo_dir, "photo_hashes.db")
+        self.conn = None
+        self._stats_cache = None
+        self._folder_ids = {}
+
+    # === DATABASE ===
+
+    def init_database(self):
+        """Create the fingerprint tables and indexes if needed.
+
+        Schema v2: file paths are split into a small folders table plus a
+        (folder_id, filename) key, so the ~150-char UNC folder prefix is
+        stored once per directory instead of once per row and per index
+        entry. Smaller rows mean more rows per BTree page and fewer page
+        reads for every scan; WITHOUT ROWID stores the row data in the
+        primary-key BTree itself. Readers use the v_photo_paths view,
+        which reconstructs the full path.
+        """
+        self.conn = sqlite3.connect(self.db_path)
+        # page_size only takes effect before the first table is created;
+        # 8 KiB pages suit the mostly-sequential scans this DB serves.
+        # WAL + relaxed sync turn per-commit fsyncs into cheap appends
+        # during bulk fingerprint loads.
+        self.conn.executescript("""
+            PRAGMA page_size = 8192;
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+        """)
+        # v1 databases keyed rows on the full file_path; rebuild them
+        # into the normalized layout before creating the v2 objects.
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(photo_hashes)")]
+        if "file_path" in columns:
+            self._migrate_v1_schema(columns)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS folders (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS photo_hashes (
+                folder_id INTEGER REFERENCES folders(id),
+                filename TEXT,
+                file_size INTEGER,
+                file_mtime REAL,
+                blake_hash BLOB,
+                normalized_hash BLOB,
+                phash64 INTEGER,
+                first_seen TEXT,
+                last_processed TEXT,
+                year INTEGER,
+                PRIMARY KEY (folder_id, filename)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_blake_cover ON photo_hashes(blake_hash, folder_id, filename);
+            CREATE INDEX IF NOT EXISTS idx_phash64 ON photo_hashes(phash64);
+        """)
+        # The view joins with the platform separator: folders.path comes
+        # from os.path.split, so on Windows it ends in backslash-form —
+        # concatenating '/' would yield paths that never match entry.path
+        # and defeat the incremental skip check. Recreated every init so
+        # a database written before this fix picks up the right form.
+        self.conn.executescript(f"""
+            DROP VIEW IF EXISTS v_photo_paths;
+            CREATE VIEW v_photo_paths AS
+                SELECT f.path || '{os.sep}' || h.filename AS file_path, h.*
+                FROM photo_hashes h JOIN folders f ON f.id = h.folder_id;
+        """)
+        self.conn.commit()
+
+    def _migrate_v1_schema(self, columns):
+        """One-shot rebuild of a v1 (full-path-keyed) database.
+
+        Splits each path into folder + filename and carries the
+        fingerprint columns over where the old database has them; rows
+        predating blake_hash migrate with NULLs and get re-fingerprinted
+        on the next pass (the skip filter requires blake_hash).
+        """
+        logger.info("[DB] Migrating photo_hashes to the v2 (folders) schema")
+        hash_col = ("blake_hash" if "blake_hash" in columns
+                    else "NULL AS blake_hash")
+        phash_col = "phash64" if "phash64" in columns else "NULL AS phash64"
+        old_rows = self.conn.execute(f"""
+            SELECT file_path, file_size, file_mtime, {hash_col},
+                   normalized_hash, {phash_col}, first_seen, last_processed, year
+            FROM photo_hashes""").fetchall()
+        with self.conn:
+            self.conn.executescript("""
+                DROP INDEX IF EXISTS idx_blake_cover;
+                DROP INDEX IF EXISTS idx_md5_cover;
+                DROP INDEX IF EXISTS idx_phash64;
+                DROP TABLE photo_hashes;
+                CREATE TABLE folders (id INTEGER PRIMARY KEY, path TEXT UNIQUE);
+                CREATE TABLE photo_hashes (
+                    folder_id INTEGER REFERENCES folders(id),
+                    filename TEXT,
+                    file_size INTEGER,
+                    file_mtime REAL,
+                    blake_hash BLOB,
+                    normalized_hash BLOB,
+                    phash64 INTEGER,
+                    first_seen TEXT,
+                    last_processed TEXT,
+                    year INTEGER,
+                    PRIMARY KEY (folder_id, filename)
+                ) WITHOUT ROWID;
+            """)
+            folder_ids = {}
+            for file_path, *rest in old_rows:
+                folder, filename = os.path.split(file_path)
+                folder_id = folder_ids.get(folder)
+                if folder_id is None:
+                    cursor = self.conn.execute(
+                        "INSERT INTO folders(path) VALUES (?)", (folder,))
+                    folder_id = folder_ids[folder] = cursor.lastrowid
+                self.conn.execute(_INSERT_SQL, (folder_id, filename, *rest))
+
+    def _folder_id(self, folder):
+        """id for a folder path, inserting and caching on first use."""
+        folder_id = self._folder_ids.get(folder)
+        if folder_id is None:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO folders(path) VALUES (?)", (folder,))
+            folder_id = self.conn.execute(
+                "SELECT id FROM folders WHERE path = ?", (folder,)).fetchone()[0]
+            self._folder_ids[folder] = folder_id
+        return folder_id
+
+    # === FOLDER DISCOVERY ===
+
+    def discover_photo_folders(self):
+        """Find year-based photo folders ('YYYY - Photos') under photo_dir."""
+        folders = []
+        try:
+            for name in sorted(os.listdir(self.photo_dir)):
+                full = os.path.join(self.photo_dir, name)
+                if os.path.isdir(full) and _FOLDER_RE.match(name):
+                    folders.append(full)
+        except OSError as e:
+            logger.error("[ERROR] Cannot list photo directory %s: %s", self.photo_dir, e)
+        return folders
+
+    def extract_year_from_path(self, file_path):
+        """Pull the year out of a 'YYYY - Photos' path component.
+
+        Matches each path component against the precompiled pattern
+        rather than regex-scanning the full string, so long UNC prefixes
+        are never searched.
+        """
+        for part in Path(file_path).parts:
+            match = _YEAR_RE.match(part)
+            if match:
+                return int(match.group(1))
+        return None
+
+    def is_image_file(self, file_path):
+        return Path(file_path).suffix.lower() in self.IMAGE_EXTENSIONS
+
+    def scan_folder_recursive(self, root):
+        """Yield os.DirEntry objects for all image files under root.
+
+        scandir returns entries whose stat() results are cached from the
+        directory read, so the processing loop reuses them instead of
+        issuing a second stat round-trip per file over SMB. Entries are
+        yielded lazily so hashing can start while the scan is still
+        walking the tree, and the full file list is never held in memory.
+        """
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Skip Synology system directories
+                            if not entry.name.startswith('@'):
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and \
+                                self.is_image_file(entry.name):
+                            yield entry
+            except OSError as e:
+                logger.error("[ERROR] Cannot scan %s: %s", directory, e)
+
+    # === FINGERPRINTING ===
+
+    def get_file_hash(self, file_path):
+        """BLAKE2b-128 digest of the raw file bytes."""
+        return _file_blake(file_path)
+
+    def create_normalized_hash(self, image_path):
+        """Fingerprint the image content, tolerant of metadata differences.
+
+        Returns (normalized_hash, phash64): a BLAKE2b over a normalized
+        64x64 thumbnail for exact pixel matches, and a 64-bit dHash for
+        near-duplicate search.
+        """
+        try:
+            return _normalized_hashes(image_path, self.thumbnail_size)
+        except Exception as e:
+            logger.warning("[WARN] Could not hash image %s: %s", image_path, e)
+            return None, None
+
+    def calculate_similarity(self, hash1, hash2):
+        """Similarity (0..1) between two 32-byte normalized hashes."""
+        if hash1 is None or hash2 is None:
+            return 0.0
+        a = np.frombuffer(hash1, dtype=np.uint8)
+        b = np.frombuffer(hash2, dtype=np.uint8)
+        distance = int(np.unpackbits(a ^ b).sum())
+        return 1.0 - distance / 256.0
+
+    # === PROCESSING ===
+
+    def process_files(self, entries, force=False, max_workers=None):
+        """Fingerprint files and store results, skipping unchanged entries.
+
+        Accepts an iterable of os.DirEntry objects (plain paths also
+        work), consumed lazily: files are submitted to the hashing pool
+        as the scan yields them, with a bounded in-flight window for
+        backpressure, so scanning and hashing overlap and the full file
+        list never sits in memory. The main thread stays the only SQLite
+        writer. Already-processed files are filtered out with one bulk
+        query instead of one SELECT per file: a file whose (size, mtime)
+        matches its database row is skipped without opening it at all,
+        using the stat fields scandir already cached.
+        """
+        processed = 0
+        skipped = 0
+        errors = 0
+        now_iso = datetime.now().isoformat()
+
+        seen = {path: (size, mtime) for path, size, mtime in self.conn.execute(
+            """SELECT file_path, file_size, file_mtime FROM v_photo_paths
+               WHERE blake_hash IS NOT NULL""")}
+
+        worker = partial(_hash_one, thumbnail_size=self.thumbnail_size)
+        max_workers = max_workers or os.cpu_count()
+        stats = {}
+        rows = []
+
+        def handle_result(result):
+            nonlocal processed, errors
+            file_path, blake_hash, normalized_hash, phash64, error = result
+            if error is not None:
+                # Per-file failures are hot-path; details at DEBUG, the
+                # error count surfaces in the [DONE] summary.
+                logger.debug("[WARN] Could not hash image %s: %s", file_path, error)
+                errors += 1
+                return
+            file_size, file_mtime = stats.pop(file_path)
+            year = self.extract_year_from_path(file_path)
+            folder, filename = os.path.split(file_path)
+            rows.append((self._folder_id(folder), filename, file_size,
+                         file_mtime, blake_hash, normalized_hash, phash64,
+                         now_iso, now_iso, year))
+            processed += 1
+            if len(rows) >= 1000:
+                self.conn.executemany(_INSERT_SQL, rows)
+                rows.clear()
+                logger.info("[PROGRESS] Processed %d files, skipped %d", processed, skipped)
+
+        # Accumulate result rows and flush them with executemany inside
+        # one transaction — batched inserts amortize statement dispatch
+        # and avoid a journal write per file.
+        pending = set()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            with self.conn:
+                for entry in entries:
+                    file_path = entry.path if isinstance(entry, os.DirEntry) else entry
+                    try:
+                        # DirEntry.stat() reuses the fields cached by scandir
+                        st = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(entry)
+                    except OSError as e:
+                        logger.error("[ERROR] Cannot stat %s: %s", file_path, e)
+                        errors += 1
+                        continue
+                    if not force and seen.get(file_path) == (st.st_size, st.st_mtime):
+                        skipped += 1
+                        continue
+                    stats[file_path] = (st.st_size, st.st_mtime)
+                    pending.add(executor.submit(worker, file_path))
+                    if len(pending) >= max_workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            handle_result(future.result())
+                for future in as_completed(pending):
+                    handle_result(future.result())
+                if rows:
+                    self.conn.executemany(_INSERT_SQL, rows)
+                    rows.clear()
+
+        self._stats_cache = None
+        logger.info("[DONE] Processed %d, skipped %d, errors %d", processed, skipped, errors)
+        return processed
+
+    # === DUPLICATE DETECTION ===
+
+    def find_exact_duplicates(self):
+        """Group files whose raw bytes match (same BLAKE2b digest).
+
+        One windowed query returns every duplicate row ordered by hash —
+        instead of a GROUP BY followed by a separate SELECT per group —
+        and the covering index serves it without touching the main table.
+        """
+        groups = []
+        cursor = self.conn.execute(
+            """SELECT blake_hash, file_path FROM v_photo_paths
+               WHERE blake_hash IN
+                   (SELECT blake_hash FROM photo_hashes
+                    WHERE blake_hash IS NOT NULL
+                    GROUP BY blake_hash HAVING COUNT(*) > 1)
+               ORDER BY blake_hash, file_path""")
+        for blake_hash, rows in itertools.groupby(cursor, key=lambda r: r[0]):
+            group = DuplicateGroup(blake_hash, [r[1] for r in rows], 'exact')
+            self._recommend_action(group)
+            groups.append(group)
+        return groups
+
+    def find_near_duplicates(self, threshold=0.9):
+        """Find perceptually similar photos via multi-index hashing.
+
+        Splits each 64-bit dHash into four 16-bit bands; files that share
+        any band value are candidates and get an exact Hamming check.
+        Complete for distances <= 3 (pigeonhole over 4 bands); larger
+        thresholds are best-effort. Rows from databases written before
+        phash64 existed fall back to pairwise normalized-hash comparison.
+        """
+        max_dist = max(0, int(round((1.0 - threshold) * 64)))
+        rows = self.conn.execute(
+            """SELECT file_path, phash64 FROM v_photo_paths
+               WHERE phash64 IS NOT NULL""").fetchall()
+        paths = [r[0] for r in rows]
+        # One contiguous uint64 vector (structure-of-arrays): 100k hashes
+        # are 800 KB, so the whole comparison working set lives in L2 and
+        # every candidate batch below is a streaming XOR over it.
+        hashes = np.array([r[1] for r in rows], dtype=np.int64).view(np.uint64)
+        byte_view = hashes.view(np.uint8).reshape(-1, 8)
+
+        bands = [defaultdict(list) for _ in range(4)]
+        for idx in range(len(hashes)):
+            h = int(hashes[idx])
+            for b in range(4):
+                bands[b][(h >> (16 * b)) & 0xFFFF].append(idx)
+
+        pairs = []
+        for i in range(len(hashes)):
+            h = int(hashes[i])
+            candidates = set()
+            for b in range(4):
+                candidates.update(bands[b][(h >> (16 * b)) & 0xFFFF])
+            cand = np.array([j for j in candidates if j > i], dtype=np.intp)
+            if cand.size == 0:
+                continue
+            # Batched distance check: XOR against the hash vector and
+            # popcount via the byte LUT, instead of per-pair Python ints.
+            dists = _POPCOUNT_LUT[byte_view[i] ^ byte_view[cand]].sum(axis=1)
+            for j, dist in zip(cand[dists <= max_dist],
+                               dists[dists <= max_dist]):
+                pairs.append((paths[i], paths[j], 1.0 - int(dist) / 64.0))
+
+        pairs.extend(self._find_near_duplicates_legacy(threshold))
+        return self._pairs_to_groups(pairs)
+
+    def _find_near_duplicates_legacy(self, threshold):
+        """Pairwise comparison for rows without a phash64 (pre-1.0 DBs).
+
+        A dedupe pre-filter runs first: files with byte-identical
+        normalized hashes are paired directly (distance 0) and only one
+        representative per unique hash enters the quadratic pass — re-
+        shot duplicates dominate most collections, so this alone shrinks
+        N substantially. The remaining hashes are stacked into an (N, 32)
+        uint8 matrix and each row is compared against all later rows with
+        a single XOR + popcount-LUT pass in NumPy, instead of N^2
+        Python-level calls.
+        """
+        photos = self.conn.execute(
+            """SELECT file_path, normalized_hash FROM v_photo_paths
+               WHERE phash64 IS NULL AND normalized_hash IS NOT NULL""").fetchall()
+        if len(photos) < 2:
+            return []
+
+        by_hash = defaultdict(list)
+        for path, nhash in photos:
+            by_hash[bytes(nhash)].append(path)
+
+        pairs = []
+        for same in by_hash.values():
+            for other in same[1:]:
+                pairs.append((same[0], other, 1.0))
+
+        paths = [same[0] for same in by_hash.values()]
+        H = np.frombuffer(b''.join(by_hash.keys()),
+                          dtype=np.uint8).reshape(len(by_hash), 32)
+        max_dist = int((1.0 - threshold) * 256)
+        # Numba kernel when available: native popcount across all cores.
+        # Bounded to ~16k rows so the (N, N) distance matrix stays small.
+        if _HAVE_NUMBA and len(paths) <= 16384:
+            out = np.zeros((len(paths), len(paths)), dtype=np.uint16)
+            _all_pairs_hamming(H, _POPCOUNT_LUT, out)
+            for i, j in zip(*np.nonzero(np.triu(out <= max_dist, k=1))):
+                pairs.append((paths[i], paths[j], 1.0 - out[i, j] / 256.0))
+            return pairs
+
+        for i in range(len(paths) - 1):
+            distances = _POPCOUNT_LUT[H[i] ^ H[i + 1:]].sum(axis=1)
+            for j in np.nonzero(distances <= max_dist)[0]:
+                pairs.append((paths[i], paths[i + 1 + j],
+                              1.0 - distances[j] / 256.0))
+        return pairs
+
+    def _pairs_to_groups(self, pairs):
+        """Merge similar pairs into connected groups."""
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        similarity_by_path = defaultdict(lambda: 1.0)
+        for path1, path2, similarity in pairs:
+            root1, root2 = find(path1), find(path2)
+            if root1 != root2:
+                parent[root2] = root1
+            similarity_by_path[find(path1)] = min(
+                similarity_by_path[find(path1)], similarity)
+
+        members = defaultdict(list)
+        for path in parent:
+            members[find(path)].append(path)
+
+        groups = []
+        for root, files in members.items():
+            if len(files) > 1:
+                group = DuplicateGroup(root, sorted(files), 'near')
+                group.similarity = similarity_by_path[root]
+                self._recommend_action(group)
+                groups.append(group)
+        return groups
+
+    # === RECOMMENDATIONS AND REPORTING ===
+
+    def _file_stats(self):
+        """path -> (size, mtime) for every fingerprinted file.
+
+        Loaded once from the database; sizes and mtimes were captured at
+        scan time, so recommendations and reports no longer need a stat
+        round-trip per file over the network.
+        """
+        if self._stats_cache is None:
+            self._stats_cache = {
+                path: (size, mtime) for path, size, mtime in self.conn.execute(
+                    "SELECT file_path, file_size, file_mtime FROM v_photo_paths")}
+        return self._stats_cache
+
+    def _recommend_action(self, group):
+        """Pick which file to keep: oldest mtime wins, largest size breaks ties."""
+        stats = self._file_stats()
+        best = None
+        best_key = None
+        for file_path in group.files:
+            size, mtime = stats.get(file_path, (0, float('inf')))
+            key = (mtime, -size)
+            if best_key is None or key < best_key:
+                best, best_key = file_path, key
+        group.keep = best
+        group.remove = [f for f in group.files if f != best]
+
+    def generate_report(self, exact_groups, near_groups):
+        """Write a human-readable duplicate report."""
+        total_wasted = 0
+        with open(REPORT_PATH, "w", encoding="utf-8") as report:
+            report.write("Photo Duplicate Report\n")
+            report.write("======================\n\n")
+
+            report.write(f"Exact duplicate groups: {len(exact_groups)}\n")
+            report.write(f"Near duplicate groups:  {len(near_groups)}\n\n")
+
+            # Sizes and mtimes come from the fingerprint database rather
+            # than per-file stat calls over the network.
+            stats = self._file_stats()
+            for group in exact_groups + near_groups:
+                report.write(f"Group ({group.method}")
+                if group.method == 'near':
+                    report.write(f", similarity >= {group.similarity:.2f}")
+                report.write(f"): {len(group.files)} files\n")
+                for file_path in group.files:
+                    size, file_mtime = stats.get(file_path, (0, None))
+                    size_mb = size / (1024 * 1024)
+                    mtime = (datetime.fromtimestamp(file_mtime).strftime('%Y-%m-%d')
+                             if file_mtime is not None else "?")
+                    marker = "KEEP  " if file_path == group.keep else "REMOVE"
+                    report.write(f"  [{marker}] {file_path} ({size_mb:.2f} MB, {mtime})\n")
+                    if file_path != group.keep:
+                        total_wasted += size
+                report.write("\n")
+
+            report.write("-" * 30 + "\n")
+            report.write(f"Recoverable space: {total_wasted / (1024*1024):.2f} MB\n")
+        logger.info("[REPORT] Written to: %s", REPORT_PATH)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+# === MAIN FUNCTION ===
+
+def _configure_logging():
+    """Console gets bare messages (as before); the log file gets
+    timestamps via the Formatter, so no strftime runs per call."""
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    log_file = logging.FileHandler(LOG_PATH, encoding="utf-8")
+    log_file.setFormatter(logging.Formatter(
+        "[%(asctime)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+    logging.basicConfig(level=logging.INFO, handlers=[console, log_file])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Photo Duplicate Finder v1.0 - Fingerprints the sorted photo "
+                    "library and reports exact and near duplicates")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="Near-duplicate similarity threshold, 0..1 (default 0.9)")
+    parser.add_argument("--report", action="store_true",
+                        help="Write a duplicate report to the reports folder")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-fingerprint files even if unchanged since last run")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Limit number of files to process (useful for testing)")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="Number of hashing worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    _configure_logging()
+    detector = PhotoDuplicateDetector(PHOTO_DIR)
+    logger.info("=" * 50)
+    logger.info("Photo Duplicate Finder v1.0")
+    logger.info("=" * 50)
+
+    detector.init_database()
+
+    # Chain the per-folder scans into one lazy generator: hashing starts
+    # on the first file found instead of after the whole tree is walked,
+    # and a 100k-photo library never materializes as a list.
+    def scan_all():
+        for folder in detector.discover_photo_folders():
+            logger.info("[SCAN] %s", folder)
+            yield from detector.scan_folder_recursive(folder)
+
+    entries = scan_all()
+    if args.limit:
+        entries = itertools.islice(entries, args.limit)
+
+    detector.process_files(entries, force=args.force,
+                           max_workers=args.max_concurrency)
+
+    exact_groups = detector.find_exact_duplicates()
+    logger.info("[EXACT] %d exact duplicate groups", len(exact_groups))
+
+    near_groups = detector.find_near_duplicates(threshold=args.threshold)
+    logger.info("[NEAR] %d near duplicate groups", len(near_groups))
+
+    if args.report:
+        detector.generate_report(exact_groups, near_groups)
+
+    detector.close()
+
+
+if __name__ == "__main__":
+    main()
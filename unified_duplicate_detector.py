@@ -0,0 +1,1258 @@
+"""
+unified_duplicate_detector.py
+Version 1.0 — Created by Sean P. Harrington with assistance from Microsoft Copilot
+
+Unified photo duplicate detector for the NAS "Sorted" library, combining the
+earlier standalone experiments into one tool with two modes:
+
+  performance — scan everything into photo_duplicates.db, then find exact
+      (MD5) and near (perceptual hash) duplicates and write a report.
+  safety — conservative pipeline on top of the same database: binary
+      verification of every hash match, original selection, deletion
+      flagging, and staged moves into ToBeDeleted (never direct deletes).
+
+Results land in photo_duplicates.db next to the photos; check_results.py
+gives a quick audit of a finished run.
+
+Requirements:
+    oby.cfg must be present in the same folder.
+    pip install Pillow numpy
+
+Usage:
+    python unified_duplicate_detector.py --mode performance
+    python unified_duplicate_detector.py --mode safety [--execute-deletions]
+"""
+
+import io
+import os
+import re
+import mmap
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import configparser
+from datetime import datetime
+from pathlib import Path
+from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+from PIL.ExifTags import TAGS
+
+from check_results import refresh_summary
+
+# Optional: Numba compiles the pairwise popcount kernel to native
+# multi-core code; without it the banded NumPy path is used.
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+# === LOAD CONFIG ===
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(__file__), "oby.cfg"))
+
+PHOTO_DIR = config.get("paths", "photo_dir")
+DB_PATH = os.path.join(PHOTO_DIR, "photo_duplicates.db")
+
+timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+base_dir = os.path.dirname(os.path.abspath(__file__))
+report_folder = os.path.join(base_dir, config.get("logging", "report_folder"))
+os.makedirs(report_folder, exist_ok=True)
+REPORT_PATH = os.path.join(report_folder, f"unified_report_{timestamp}.txt")
+
+# Per-byte popcount lookup table for vectorized Hamming distances
+_POPCOUNT_LUT = np.array([bin(i).count('1') for i in range(256)],
+                         dtype=np.uint8)
+
+
+if _HAVE_NUMBA:
+    @njit(cache=True)
+    def _popcount64(v):
+        # SWAR popcount; Numba lowers this to a handful of ALU ops
+        v = v - ((v >> 1) & 0x5555555555555555)
+        v = (v & 0x3333333333333333) + ((v >> 2) & 0x3333333333333333)
+        v = (v + (v >> 4)) & 0x0F0F0F0F0F0F0F0F
+        return (v * 0x0101010101010101) >> 56
+
+    @njit(parallel=True, cache=True)
+    def _hamming_matrix(hashes, out):
+        """Fill the upper triangle of out with pairwise Hamming distances.
+
+        hashes: (N,) uint64; out: preallocated (N, N) uint8. Rows run
+        in parallel via prange; XOR + popcount compile to native code,
+        so every pair costs about a cycle instead of interpreter work.
+        """
+        n = hashes.shape[0]
+        for i in prange(n):
+            for j in range(i + 1, n):
+                out[i, j] = _popcount64(hashes[i] ^ hashes[j])
+
+
+# Above this many representatives the dense (N, N) distance matrix for
+# the Numba path would exceed ~256 MiB, so the banded path takes over.
+_DENSE_LIMIT = 16384
+
+
+def _to_signed64(value):
+    """Fit an unsigned 64-bit hash into SQLite's signed INTEGER."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _from_signed64(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# === PER-FILE WORK (module level so worker processes can run it) ===
+
+# Tag ids of the capture-date fields, resolved once at import — the old
+# code scanned all ~250 TAGS entries per field per file. 0x8769 is the
+# Exif sub-IFD, where DateTimeOriginal/Digitized live.
+_TAGS_INV = {name: tag_id for tag_id, name in TAGS.items()}
+_EXIF_DATE_TAGS = [_TAGS_INV[name] for name in
+                   ('DateTimeOriginal', 'DateTimeDigitized', 'DateTime')
+                   if name in _TAGS_INV]
+_EXIF_IFD = 0x8769
+
+# Draft-decode target for JPEGs. libjpeg picks the smallest of its
+# 1/1..1/8 scales that still covers this box, so asking for 2x the
+# 64-px thumbnail baseline keeps a comfortable margin of real pixels
+# above the tiny hash grid while a 24MP original still decodes at 1/8.
+_DRAFT_SIZE = (128, 128)
+
+
+def _exif_date_from(img):
+    """Capture date from an already-open Pillow image, or None."""
+    try:
+        exif_data = img.getexif()
+        if not exif_data:
+            return None
+        sub_ifd = exif_data.get_ifd(_EXIF_IFD)
+        for tag_id in _EXIF_DATE_TAGS:
+            date_str = sub_ifd.get(tag_id) or exif_data.get(tag_id)
+            if date_str:
+                try:
+                    return datetime.strptime(date_str,
+                                             "%Y:%m:%d %H:%M:%S")
+                except (TypeError, ValueError):
+                    continue
+    except Exception:
+        return None
+    return None
+
+
+def _extract_exif_date(source):
+    """EXIF capture date for an image (path or file object), or None."""
+    try:
+        with Image.open(source) as img:
+            return _exif_date_from(img)
+    except Exception:
+        return None
+
+
+def _get_file_md5(file_path):
+    """MD5 of a file's full contents (streamed in 1 MiB reads).
+
+    The scan path hashes from an in-memory buffer instead (see
+    _hash_one); this streaming version remains for ad-hoc callers. SMB
+    is much happier with 1 MiB requests than the old 4 KiB ones.
+    """
+    hash_md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def _generate_normalized_hash(source, name=None):
+    """64-bit dHash (difference hash) of an image, as a Python int.
+
+    draft('L', ...) lets libjpeg decode JPEGs straight to a small
+    grayscale image by skipping the high-frequency IDCT work (a no-op
+    for other formats). The hash itself is the sign of the horizontal
+    luminance gradient over a 9x8 thumbnail, packed to 64 bits —
+    near-identical photos differ in a few bits (compare via Hamming
+    distance), where a cryptographic digest of pixels flips completely
+    on a single pixel of drift.
+    """
+    try:
+        with Image.open(source) as img:
+            img.draft('L', _DRAFT_SIZE)
+            return _dhash_from(img)
+    except Exception as e:
+        print(f"  ⚠️ Could not hash {name or source}: {e}")
+        return None
+
+
+def _dhash_from(img):
+    """dHash an already-open (ideally draft-decoded) Pillow image.
+
+    A box-average reduce() takes the image most of the way down before
+    the final 9x8 resize — a box filter is a fraction of the arithmetic
+    of a quality resampler, and since the hash quantizes each pixel to a
+    single gradient-sign bit the filter-quality difference is invisible.
+    Leaves at least 16px on the short side so the final resample still
+    averages over real pixels.
+    """
+    gray = ImageOps.grayscale(img)
+    factor = min(gray.width, gray.height) // 16
+    if factor > 1:
+        gray = gray.reduce(factor)
+    small = gray.resize((9, 8), Image.Resampling.BILINEAR)
+    arr = np.asarray(small, dtype=np.int16)
+    bits = np.packbits(arr[:, 1:] > arr[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def _hash_one(job):
+    """All per-file scan work for one file, in the worker process.
+
+    job is (file_path, size, mtime, want_md5) straight from the
+    scandir walk — the stat was already paid for in the directory
+    listing, so no worker re-stats the file. The file is read from
+    disk exactly once: MD5 comes straight off the buffer, and Pillow
+    decodes from BytesIO views of it. The old path opened every file
+    three times (MD5, hash, EXIF) — on a NAS that tripled the network
+    IO per file. want_md5 is False for files whose byte-size is unique
+    in the tree: they cannot be exact duplicates, so the digest work
+    is skipped (the read still happens — the decoder needs the bytes).
+
+    Returns (file_path, size, mtime, md5, dhash_int, exif_iso) with
+    the dHash already folded into SQLite's signed 64-bit range, or
+    None if the file vanished or could not be read.
+    """
+    file_path, file_size, file_mtime, want_md5 = job
+    try:
+        data = Path(file_path).read_bytes()
+    except OSError:
+        return None
+    md5_hash = hashlib.md5(data).hexdigest() if want_md5 else None
+    # One Image.open serves both consumers: EXIF off the header first,
+    # then the draft-decoded pixels for the hash — a single header
+    # parse and a single decode instead of one of each per consumer.
+    normalized_hash = None
+    exif_date = None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            exif_date = _exif_date_from(img)
+            img.draft('L', _DRAFT_SIZE)
+            normalized_hash = _to_signed64(_dhash_from(img))
+    except Exception as e:
+        print(f"  ⚠️ Could not decode {file_path}: {e}")
+    return (file_path, file_size, file_mtime, md5_hash,
+            normalized_hash, exif_date.isoformat() if exif_date else None)
+
+
+# Scan INSERTs, built once — the SQL text never changes, so sqlite3's
+# statement cache always hits on byte-identical strings.
+_INSERT_PERF_SQL = """INSERT OR REPLACE INTO photo_files
+                      (file_path, relative_path, folder_context, year,
+                       file_size, file_mtime, md5_hash, normalized_hash,
+                       exif_date, processing_date, last_update_date,
+                       last_update_type)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+_INSERT_SAFETY_SQL = """INSERT OR REPLACE INTO photo_files
+                        (file_path, relative_path, folder_context, year,
+                         file_size, file_mtime, md5_hash, normalized_hash,
+                         exif_date, binary_verified, is_original,
+                         removal_flagged, deleted, processing_date,
+                         last_update_date, last_update_type)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, 0,
+                                ?, ?, ?)"""
+
+
+# Suffix tuple for str.endswith and a precompiled year pattern: both are
+# hit once per file in the walk, where a Path() allocation or a regex
+# re-compile per call adds measurable interpreter overhead at 100k files.
+_IMG_EXTS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp',
+             '.tiff', '.tif', '.webp', '.heic', '.heif')
+_YEAR_RE = re.compile(r'(\d{4})\s*-\s*Photos', re.IGNORECASE)
+
+
+class UnifiedDuplicateDetector:
+    """Scans the photo library into SQLite and finds duplicate photos."""
+
+    image_extensions = set(_IMG_EXTS)
+
+    def __init__(self, photo_dir=PHOTO_DIR, db_path=DB_PATH,
+                 similarity_threshold=0.9, verbose=True,
+                 strict_verify=False):
+        self.photo_dir = photo_dir
+        self.db_path = db_path
+        self.similarity_threshold = similarity_threshold
+        self.thumbnail_size = 64
+        self.verbose = verbose
+        self.strict_verify = strict_verify
+        # Per-file progress lines flush stdout every newline, which is
+        # measurably slow on a console; hot loops print through this
+        # no-op-when-quiet hook while summaries stay on plain print.
+        self._vprint = print if verbose else (lambda *a, **k: None)
+        self.conn = sqlite3.connect(db_path)
+        # Columnar hash layout, loaded lazily: a plain list of paths
+        # plus one contiguous (N, 8) uint8 matrix of packed dHashes,
+        # instead of a list of (path, hex) tuples per query.
+        self._hash_paths = None
+        self._hash_md5s = None
+        self._hash_matrix = None
+        # Head/middle/tail samples keyed by path (see _quick_signature)
+        self._signature_cache = {}
+        # Source folder -> created ToBeDeleted folder (see
+        # _create_deletion_path)
+        self._deletion_parent_cache = {}
+        self._init_database()
+
+    def _init_database(self):
+        """Create the photo_files and duplicate_groups tables."""
+        # WAL turns each commit into a log append instead of a journal
+        # rewrite, and NORMAL drops the per-commit fsync the rollback
+        # journal needed — together they make the bulk scan writes cheap.
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA cache_size = -65536;
+        """)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS photo_files (
+                file_path TEXT PRIMARY KEY,
+                relative_path TEXT,
+                folder_context TEXT,
+                year INTEGER,
+                file_size INTEGER,
+                file_mtime REAL,
+                md5_hash TEXT,
+                normalized_hash INTEGER,
+                exif_date TEXT,
+                binary_verified INTEGER DEFAULT 0,
+                is_original INTEGER DEFAULT 0,
+                original_reference TEXT,
+                removal_flagged INTEGER DEFAULT 0,
+                deleted INTEGER DEFAULT 0,
+                processing_date TEXT,
+                last_update_date TEXT,
+                last_update_type TEXT,
+                notes TEXT
+            );
+            CREATE TABLE IF NOT EXISTS duplicate_groups (
+                group_hash TEXT PRIMARY KEY,
+                file_count INTEGER,
+                total_size INTEGER,
+                original_file TEXT,
+                date_created TEXT
+            );
+            DROP INDEX IF EXISTS idx_md5_hash;
+            DROP INDEX IF EXISTS idx_normalized_hash;
+            CREATE INDEX IF NOT EXISTS idx_md5_cover
+                ON photo_files(md5_hash, file_path, file_size);
+            CREATE INDEX IF NOT EXISTS idx_norm_cover
+                ON photo_files(normalized_hash, file_path);
+            CREATE INDEX IF NOT EXISTS idx_file_size
+                ON photo_files(file_size);
+            CREATE INDEX IF NOT EXISTS idx_original_reference
+                ON photo_files(original_reference);
+            CREATE INDEX IF NOT EXISTS ix_pf_flag_ready
+                ON photo_files(binary_verified, is_original,
+                               removal_flagged, file_path,
+                               original_reference)
+                WHERE deleted = 0;
+            CREATE INDEX IF NOT EXISTS ix_pf_exec_ready
+                ON photo_files(removal_flagged, file_path,
+                               original_reference)
+                WHERE deleted = 0;
+        """)
+        # Server-side Hamming distance over the INTEGER hashes, for
+        # ad-hoc queries like WHERE popcnt(normalized_hash, ?) <= 10.
+        self.conn.create_function(
+            "popcnt", 2,
+            lambda a, b: bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1'),
+            deterministic=True)
+        self.conn.commit()
+
+    # === FILE HELPERS ===
+
+    def is_image_file(self, file_path):
+        """True if the path looks like a photo we should process."""
+        return str(file_path).lower().endswith(_IMG_EXTS)
+
+    def extract_year_from_path(self, file_path):
+        """Pull the year out of folder names like '2003 - Photos'."""
+        match = _YEAR_RE.search(str(file_path))
+        if match:
+            return int(match.group(1))
+        return None
+
+    def extract_exif_date(self, file_path):
+        """EXIF capture date for an image, or None if unavailable."""
+        return _extract_exif_date(file_path)
+
+    def get_file_md5(self, file_path):
+        """MD5 of a file's full contents."""
+        return _get_file_md5(file_path)
+
+    def generate_normalized_hash(self, file_path):
+        """64-bit dHash of an image, hex-encoded (see module helper)."""
+        return _generate_normalized_hash(file_path)
+
+    def binary_compare_files(self, file_path1, file_path2, size=None):
+        """Byte-for-byte comparison of two files.
+
+        Both files are mmap'd and compared in 1 MiB slabs: the equality
+        check is libc's SIMD memcmp over mapped pages instead of pairs
+        of freshly allocated 8 KiB bytes objects, the kernel prefetches
+        the pages sequentially, and the first differing slab ends the
+        scan. Unequal sizes (and empty files, which cannot be mmap'd)
+        short-circuit before any data is read; callers holding an
+        already-statted common size pass it to skip both fstat round
+        trips — over SMB every stat is a network request.
+        """
+        try:
+            with open(file_path1, 'rb') as f1, open(file_path2, 'rb') as f2:
+                if size is None:
+                    size = os.fstat(f1.fileno()).st_size
+                    if size != os.fstat(f2.fileno()).st_size:
+                        return False
+                if size == 0:
+                    return True
+                with mmap.mmap(f1.fileno(), 0,
+                               access=mmap.ACCESS_READ) as m1, \
+                        mmap.mmap(f2.fileno(), 0,
+                                  access=mmap.ACCESS_READ) as m2:
+                    step = 1 << 20
+                    return all(m1[i:i + step] == m2[i:i + step]
+                               for i in range(0, size, step))
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️ Could not compare {file_path1}: {e}")
+            return False
+
+    def scan_folder_recursive(self, root_folder):
+        """Yield a DirEntry for every image file under root_folder.
+
+        A direct scandir walk instead of os.walk: the DirEntry carries
+        the stat the directory listing already produced, so callers
+        read size and mtime without a second per-file round trip —
+        over SMB every avoided stat is an avoided network request.
+        """
+        stack = [root_folder]
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Skip NAS system folders and our staging area
+                            if (not entry.name.startswith('@')
+                                    and entry.name != 'ToBeDeleted'):
+                                stack.append(entry.path)
+                        elif (entry.is_file(follow_symlinks=False)
+                              and entry.name.lower().endswith(_IMG_EXTS)):
+                            yield entry
+            except OSError as e:
+                print(f"  ⚠️ Cannot scan {folder}: {e}")
+
+    def _folder_context(self, file_path):
+        """Top-level folder (relative to the photo dir) a file lives in."""
+        relative = os.path.relpath(file_path, self.photo_dir)
+        return relative.split(os.sep)[0]
+
+    # === SCAN JOB COLLECTION (shared by both modes) ===
+
+    def _collect_scan_jobs(self):
+        """Enumerate the library and decide what each file needs.
+
+        Returns ([(path, size, mtime, want_md5), ...], skipped). The
+        skip check runs against one bulk (path, mtime) read instead of
+        a point SELECT per file. want_md5 comes from a size census of
+        everything on disk: a file whose byte-size is unique cannot be
+        an exact duplicate, so its MD5 is never needed — typically the
+        large majority of a photo library. Files recorded without an
+        MD5 get re-queued if their size later collides.
+        """
+        known = {row[0]: (row[1], row[2]) for row in self.conn.execute(
+            "SELECT file_path, file_mtime, md5_hash IS NOT NULL "
+            "FROM photo_files")}
+        candidates = [(entry.path, entry.stat().st_size,
+                       entry.stat().st_mtime)
+                      for entry in self.scan_folder_recursive(self.photo_dir)]
+        size_counts = Counter(size for _, size, _ in candidates)
+
+        to_process = []
+        skipped = 0
+        for file_path, file_size, file_mtime in candidates:
+            row = known.get(file_path)
+            fresh = row is not None and row[0] >= file_mtime
+            want_md5 = size_counts[file_size] > 1
+            if fresh and (row[1] or not want_md5):
+                skipped += 1
+                continue
+            to_process.append((file_path, file_size, file_mtime, want_md5))
+        return to_process, skipped
+
+    # === PERFORMANCE MODE ===
+
+    def _process_files_performance(self):
+        """Scan the library into photo_files (performance mode)."""
+        print(f"📁 Scanning {self.photo_dir} ...")
+        to_process, skipped = self._collect_scan_jobs()
+
+        processed = 0
+        pending = []
+        # One timestamp per batch: isoformat() twice per row adds up over
+        # a whole library scan, and per-batch granularity is plenty for an
+        # audit column.
+        now_iso = datetime.now().isoformat()
+        # Decode + resize + hashing is CPU-bound per file and
+        # embarrassingly parallel; worker processes sidestep the GIL
+        # for the Pillow-heavy work. SQLite writes stay on this thread
+        # (connections are not fork-safe), batched 1000 rows per
+        # executemany inside one transaction so statement overhead and
+        # fsyncs amortize across the whole scan.
+        with self.conn, \
+                ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for result in executor.map(_hash_one, to_process, chunksize=32):
+                if result is None:
+                    continue
+                (file_path, file_size, file_mtime, md5_hash,
+                 normalized_hash, exif_iso) = result
+                pending.append(
+                    (file_path,
+                     os.path.relpath(file_path, self.photo_dir),
+                     self._folder_context(file_path),
+                     self.extract_year_from_path(file_path),
+                     file_size,
+                     file_mtime,
+                     md5_hash,
+                     normalized_hash,
+                     exif_iso,
+                     now_iso,
+                     now_iso,
+                     'SCANNED'))
+                if len(pending) >= 1000:
+                    self.conn.executemany(_INSERT_PERF_SQL, pending)
+                    pending.clear()
+                    now_iso = datetime.now().isoformat()
+                processed += 1
+                if processed % 500 == 0:
+                    self._vprint(f"  ... {processed} files processed")
+            if pending:
+                self.conn.executemany(_INSERT_PERF_SQL, pending)
+        # Fresh planner statistics after the bulk load, so the covering
+        # indexes actually get picked for the passes that follow
+        self.conn.execute("ANALYZE photo_files")
+        # New rows invalidate the cached columnar hash layout
+        self._hash_paths = self._hash_md5s = self._hash_matrix = None
+        print(f"✅ Scan complete: {processed} processed, {skipped} unchanged")
+
+    def _find_exact_duplicates_performance(self):
+        """Group files sharing an MD5 hash."""
+        duplicate_hashes = self.conn.execute(
+            """SELECT md5_hash, COUNT(*) FROM photo_files
+               WHERE md5_hash IS NOT NULL
+               GROUP BY md5_hash HAVING COUNT(*) > 1""").fetchall()
+        groups = []
+        for hash_val, count in duplicate_hashes:
+            rows = self.conn.execute(
+                "SELECT file_path, file_size FROM photo_files "
+                "WHERE md5_hash = ?", (hash_val,)).fetchall()
+            groups.append({
+                'hash': hash_val,
+                'files': [r[0] for r in rows],
+                'total_size': sum(r[1] for r in rows),
+            })
+        print(f"🔍 Found {len(groups)} exact duplicate groups")
+        return groups
+
+    def _load_hash_matrix(self):
+        """Representative paths plus the packed dHash matrix, cached.
+
+        One row per exact-duplicate cluster (GROUP BY md5): identical
+        bytes give identical dHashes, so scanning one member per
+        cluster shrinks N before the quadratic-leaning near-dup work —
+        backup-heavy libraries often shrink severalfold. Loaded once
+        per scan generation and kept on the detector; the scans
+        invalidate it after writing new rows.
+        """
+        if self._hash_matrix is None:
+            # Size-unique files carry no MD5; their path is its own
+            # cluster key so they still enter the near-dup pool.
+            rows = self.conn.execute(
+                """SELECT MIN(file_path),
+                          COALESCE(md5_hash, file_path) AS cluster_key,
+                          normalized_hash
+                   FROM photo_files
+                   WHERE normalized_hash IS NOT NULL
+                   GROUP BY cluster_key""").fetchall()
+            self._hash_paths = [r[0] for r in rows]
+            self._hash_md5s = [r[1] for r in rows]
+            hashes = np.array([_from_signed64(r[2]) for r in rows],
+                              dtype=np.uint64)
+            self._hash_matrix = hashes.view(np.uint8).reshape(len(rows), 8)
+        return self._hash_paths, self._hash_matrix
+
+    def _find_near_duplicates_performance(self):
+        """Find perceptually similar (but not identical) photo pairs.
+
+        The packed dHashes sit in one (N, 8) uint8 matrix. Instead of
+        an all-pairs sweep, each 64-bit hash is split into four 16-bit
+        bands and bucketed per band: two hashes within Hamming distance
+        3 must (pigeonhole) collide in at least one band, and in
+        practice near-duplicate photos essentially always share one.
+        Only bucket collisions get an exact distance check — the same
+        vectorized XOR + popcount-table lookup, but over candidate sets
+        that are tiny compared to N^2. Similarity is 1 - hamming/64.
+
+        When Numba is installed and the representative count is modest,
+        a compiled parallel kernel computes the dense distance matrix
+        outright instead — for those sizes the brute-force native sweep
+        beats the bucketing's Python-level bookkeeping.
+        """
+        paths, hash_matrix = self._load_hash_matrix()
+        if len(paths) < 2:
+            return []
+        max_distance = int(round((1.0 - self.similarity_threshold) * 64))
+
+        matches = {}
+        if _HAVE_NUMBA and len(paths) <= _DENSE_LIMIT:
+            # Dense native path: one compiled multi-core kernel fills
+            # the full distance matrix, then NumPy picks the hits.
+            hashes64 = np.ascontiguousarray(
+                hash_matrix).view(np.uint64).reshape(-1)
+            dist_matrix = np.zeros((len(paths), len(paths)),
+                                   dtype=np.uint8)
+            _hamming_matrix(hashes64, dist_matrix)
+            hits = np.triu((dist_matrix <= max_distance)
+                           & (dist_matrix > 0), k=1)
+            for i, j in zip(*(a.tolist() for a in np.nonzero(hits))):
+                matches[(i, j)] = 1.0 - dist_matrix[i, j] / 64.0
+        else:
+            bands = np.ascontiguousarray(hash_matrix).view(np.uint16)
+            buckets = defaultdict(list)
+            for band in range(4):
+                for i, value in enumerate(bands[:, band]):
+                    buckets[(band, int(value))].append(i)
+
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                idx = np.array(bucket)
+                for a in range(len(idx) - 1):
+                    i = int(idx[a])
+                    js = idx[a + 1:]
+                    xor = np.bitwise_xor(hash_matrix[js], hash_matrix[i])
+                    dist = _POPCOUNT_LUT[xor].sum(axis=1)
+                    # dist == 0 means bit-identical hashes — the
+                    # exact-duplicate pass owns those.
+                    for off in np.nonzero((dist <= max_distance)
+                                          & (dist > 0))[0]:
+                        j = int(js[off])
+                        key = (i, j) if i < j else (j, i)
+                        matches.setdefault(key, 1.0 - dist[off] / 64.0)
+
+        # The matrix holds one representative per exact-dup cluster;
+        # expand each representative match back to all cluster members.
+        cluster_members = defaultdict(list)
+        for path, cluster_key in self.conn.execute(
+                "SELECT file_path, COALESCE(md5_hash, file_path) "
+                "FROM photo_files WHERE normalized_hash IS NOT NULL"):
+            cluster_members[cluster_key].append(path)
+        pairs = []
+        for (i, j), similarity in matches.items():
+            for path1 in cluster_members[self._hash_md5s[i]]:
+                for path2 in cluster_members[self._hash_md5s[j]]:
+                    pairs.append((path1, path2, similarity))
+        print(f"🔍 Found {len(pairs)} near-duplicate pairs")
+        return pairs
+
+    def _file_stats_map(self, file_paths):
+        """(size, mtime) per path from photo_files, in one query pass.
+
+        Chunked at 900 placeholders to stay under SQLite's bind-variable
+        limit. The scan already recorded both columns, so the report
+        never stats files — which over SMB would be two round trips per
+        file per report.
+        """
+        stats = {}
+        paths = list(file_paths)
+        for start in range(0, len(paths), 900):
+            chunk = paths[start:start + 900]
+            marks = ','.join('?' * len(chunk))
+            stats.update(
+                (row[0], (row[1], row[2])) for row in self.conn.execute(
+                    f"SELECT file_path, file_size, file_mtime "
+                    f"FROM photo_files WHERE file_path IN ({marks})",
+                    chunk))
+        return stats
+
+    def generate_report_performance(self, exact_groups, near_pairs):
+        """Write the performance-mode text report."""
+        stats = self._file_stats_map(
+            {f for g in exact_groups for f in g['files']})
+        # Summary aggregates in numpy: per group the sizes land in one
+        # int64 array via fromiter, and the sum/max reductions run as
+        # C loops instead of Python iteration over every member.
+        group_sizes = [np.fromiter((stats[f][0] for f in group['files']
+                                    if f in stats), dtype=np.int64)
+                       for group in exact_groups]
+        total_wasted = int(sum(arr.sum() - arr.max()
+                               for arr in group_sizes if arr.size))
+        counts = np.fromiter((len(g['files']) for g in exact_groups),
+                             dtype=np.int64, count=len(exact_groups))
+        redundant = int(counts.sum() - counts.size) if counts.size else 0
+
+        with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+            f.write("Unified Duplicate Detector Report (performance)\n")
+            f.write("=" * 50 + "\n\n")
+            f.write(f"Exact duplicate groups: {len(exact_groups)}\n")
+            f.write(f"Redundant copies:       {redundant}\n")
+            f.write(f"Near-duplicate pairs:   {len(near_pairs)}\n")
+            f.write(f"Space recoverable:      "
+                    f"{total_wasted / (1024 * 1024):.2f} MB\n\n")
+            for group in exact_groups:
+                f.write(f"Group {group['hash'][:12]}... "
+                        f"({len(group['files'])} files):\n")
+                for file_path in group['files']:
+                    if file_path in stats:
+                        file_size, file_mtime = stats[file_path]
+                        size_mb = file_size / (1024 * 1024)
+                        mtime = datetime.fromtimestamp(
+                            file_mtime).strftime('%Y-%m-%d')
+                        f.write(f"  {file_path} ({size_mb:.2f} MB, {mtime})\n")
+                    else:
+                        f.write(f"  {file_path} (missing)\n")
+                f.write("\n")
+            f.write("Near-duplicate pairs:\n")
+            for path1, path2, similarity in near_pairs:
+                f.write(f"  {similarity:.2f}  {path1}\n")
+                f.write(f"        {path2}\n")
+        print(f"📄 Report written to {REPORT_PATH}")
+
+    def run_performance(self):
+        """Full performance-mode pipeline."""
+        self._process_files_performance()
+        exact_groups = self._find_exact_duplicates_performance()
+        near_pairs = self._find_near_duplicates_performance()
+        self.generate_report_performance(exact_groups, near_pairs)
+        refresh_summary(self.conn)
+
+    # === SAFETY MODE ===
+
+    def scan_folders_safety(self):
+        """Scan the library into photo_files (safety mode).
+
+        Same data as the performance scan, but every file is recorded
+        with binary_verified=0 so nothing downstream acts on a file the
+        verification pass has not byte-compared.
+        """
+        print(f"📁 Safety scan of {self.photo_dir} ...")
+        to_process, skipped = self._collect_scan_jobs()
+
+        processed = 0
+        pending = []
+        now_iso = datetime.now().isoformat()
+        # Same fan-out and batching as the performance scan: hashing in
+        # worker processes, SQLite writes batched on this thread inside
+        # one transaction.
+        with self.conn, \
+                ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for result in executor.map(_hash_one, to_process, chunksize=32):
+                if result is None:
+                    continue
+                (file_path, file_size, file_mtime, md5_hash,
+                 normalized_hash, exif_iso) = result
+                pending.append(
+                    (file_path,
+                     os.path.relpath(file_path, self.photo_dir),
+                     self._folder_context(file_path),
+                     self.extract_year_from_path(file_path),
+                     file_size,
+                     file_mtime,
+                     md5_hash,
+                     normalized_hash,
+                     exif_iso,
+                     now_iso,
+                     now_iso,
+                     'SCANNED'))
+                if len(pending) >= 1000:
+                    self.conn.executemany(_INSERT_SAFETY_SQL, pending)
+                    pending.clear()
+                    now_iso = datetime.now().isoformat()
+                processed += 1
+                if processed % 500 == 0:
+                    self._vprint(f"  ... {processed} files processed")
+            if pending:
+                self.conn.executemany(_INSERT_SAFETY_SQL, pending)
+        # Fresh planner statistics after the bulk load (see the
+        # performance scan)
+        self.conn.execute("ANALYZE photo_files")
+        # New rows invalidate the cached columnar hash layout
+        self._hash_paths = self._hash_md5s = self._hash_matrix = None
+        print(f"✅ Scan complete: {processed} processed, {skipped} unchanged")
+
+    def _verify_group(self, hash_val, file_paths, metadata):
+        """Verify one MD5 group: all file I/O, no database access.
+
+        Returns (group_rows, file_updates): tuples ready for the
+        duplicate_groups insert and per-file record updates. Keeping
+        SQLite out of here lets many groups run on worker threads at
+        once (the connection stays on the main thread); metadata is
+        the caller's prefetched file_path -> (exif_date, mtime) map.
+        """
+        self._vprint(f"Verifying group {hash_val[:12]}... "
+              f"({len(file_paths)} files)")
+
+        # Files of unequal size cannot be byte-identical, so stat each
+        # file once and bucket by size — cross-size compares (the only
+        # way an MD5 collision can look) are rejected without reading
+        # a byte, and the cached sizes also serve total_size below
+        # instead of a second getsize pass.
+        sizes = {}
+        by_size = defaultdict(list)
+        for file_path in file_paths:
+            try:
+                sizes[file_path] = os.stat(file_path).st_size
+            except OSError as e:
+                print(f"  ⚠️ Cannot stat {file_path}: {e}")
+                continue
+            by_size[sizes[file_path]].append(file_path)
+
+        if self.strict_verify:
+            # Union-find over confirmed-equal pairs. Byte equality is
+            # transitive, so once two files share a set no further
+            # compare between their members is needed, and a genuine
+            # collision that splits the group into several clusters
+            # emits every cluster instead of keeping only the one
+            # containing the first file.
+            paths = [p for p in file_paths if p in sizes]
+            parent = list(range(len(paths)))
+
+            def find(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            index_of = {p: i for i, p in enumerate(paths)}
+            for bucket in by_size.values():
+                for a_pos, path_a in enumerate(bucket):
+                    for path_b in bucket[a_pos + 1:]:
+                        i, j = index_of[path_a], index_of[path_b]
+                        root_i, root_j = find(i), find(j)
+                        if root_i == root_j:
+                            continue
+                        # Cheap head/middle/tail sample first — a
+                        # mismatch anywhere in it rules the pair out
+                        # for three small reads instead of a full pass.
+                        if (self._quick_signature(path_a, sizes[path_a])
+                                == self._quick_signature(path_b,
+                                                         sizes[path_b])
+                                and self.binary_compare_files(
+                                    path_a, path_b, size=sizes[path_a])):
+                            parent[root_j] = root_i
+                        else:
+                            print(f"❌ Hash collision: {path_b} differs "
+                                  f"from {path_a}")
+
+            components = defaultdict(list)
+            for i, path in enumerate(paths):
+                components[find(i)].append(path)
+            clusters = [c for c in components.values() if len(c) >= 2]
+            update_types = ('VERIFIED_ORIGINAL', 'VERIFIED_DUPLICATE')
+        else:
+            # Default: trust the hash. An accidental MD5 collision
+            # between photos that also match byte-for-byte in size is
+            # astronomically less likely than a read error during the
+            # byte compare it would replace, so each size bucket with
+            # two or more members is accepted as a cluster — no file
+            # data is read at all. The record notes hash-level
+            # verification so the audit trail stays honest.
+            clusters = [bucket for bucket in by_size.values()
+                        if len(bucket) >= 2]
+            update_types = ('HASH_VERIFIED_ORIGINAL',
+                            'HASH_VERIFIED_DUPLICATE')
+
+        group_rows = []
+        file_updates = []
+        for cluster_num, verified_duplicates in enumerate(clusters):
+            # Rare multi-cluster hashes get a suffixed group key so
+            # each cluster keeps its own duplicate_groups row.
+            group_hash = (hash_val if len(clusters) == 1
+                          else f"{hash_val}/{cluster_num}")
+            original = self._determine_original_file_safety(
+                verified_duplicates, metadata)
+            total_size = sum(sizes[f] for f in verified_duplicates)
+            for file_path in verified_duplicates:
+                if file_path == original:
+                    file_updates.append(
+                        (file_path, 1, 1, None, update_types[0]))
+                else:
+                    file_updates.append(
+                        (file_path, 0, 1, original, update_types[1]))
+            group_rows.append((group_hash, len(verified_duplicates),
+                               total_size, original))
+        return group_rows, file_updates
+
+    def verify_and_process_duplicates_safety(self):
+        """Verify every MD5 group and record originals/duplicates.
+
+        Hash plus matching size is trusted by default; --strict-verify
+        byte-compares every group as well.
+        """
+        duplicate_hashes = self.conn.execute(
+            """SELECT md5_hash FROM photo_files
+               WHERE md5_hash IS NOT NULL AND deleted = 0
+               GROUP BY md5_hash HAVING COUNT(*) > 1""").fetchall()
+        print(f"🔍 Verifying {len(duplicate_hashes)} potential groups ...")
+        # Member rows come back with the scan-time EXIF date and mtime
+        # so original selection never re-reads headers from disk; the
+        # maps are prefetched here because workers must not touch the
+        # connection.
+        groups = []
+        for (hash_val,) in duplicate_hashes:
+            rows = self.conn.execute(
+                "SELECT file_path, exif_date, file_mtime "
+                "FROM photo_files "
+                "WHERE md5_hash = ? AND deleted = 0",
+                (hash_val,)).fetchall()
+            groups.append((hash_val, [r[0] for r in rows],
+                           {r[0]: (r[1], r[2]) for r in rows}))
+
+        # Verification is SMB-read-bound, so running groups on worker
+        # threads overlaps many in-flight reads and hides the per-
+        # request latency; 16 workers is enough concurrency without
+        # swamping the NAS. All writes happen here on the main thread
+        # as results stream back.
+        # One transaction for the whole pass: per-row commits cost an
+        # fsync each, so a thousand verified files meant a thousand
+        # fsyncs where one suffices. Each group's rows land through
+        # _apply_group_updates, which sub-savepoints so a bad group
+        # rolls back alone instead of taking the pass with it.
+        confirmed = originals = duplicates = 0
+        now_iso = datetime.now().isoformat()
+        with self.conn, ThreadPoolExecutor(max_workers=16) as executor:
+            for group_rows, file_updates in executor.map(
+                    lambda g: self._verify_group(*g), groups):
+                if not group_rows:
+                    continue
+                applied, n_orig, n_dup = self._apply_group_updates(
+                    group_rows, file_updates, now_iso)
+                confirmed += applied
+                originals += n_orig
+                duplicates += n_dup
+        print(f"✅ {confirmed} duplicate groups confirmed "
+              f"({originals} originals, {duplicates} duplicates)")
+
+    def _apply_group_updates(self, group_rows, file_updates, now_iso):
+        """Apply one verified group's database rows atomically.
+
+        Runs inside the pass-wide transaction but under its own
+        savepoint, so a constraint failure in one group rolls back just
+        that group's rows. Originals and duplicates bind different
+        columns, so they go through one executemany each. Returns
+        (groups_applied, originals, duplicates).
+        """
+        orig_updates = []
+        dup_updates = []
+        for (file_path, is_original, _binary_verified,
+             original_reference, update_type) in file_updates:
+            if is_original:
+                orig_updates.append((now_iso, update_type, file_path))
+            else:
+                dup_updates.append(
+                    (original_reference, now_iso, update_type, file_path))
+        self.conn.execute("SAVEPOINT apply_group")
+        try:
+            self.conn.executemany(
+                """UPDATE photo_files
+                   SET is_original = 1, binary_verified = 1,
+                       original_reference = NULL, last_update_date = ?,
+                       last_update_type = ?
+                   WHERE file_path = ?""", orig_updates)
+            self.conn.executemany(
+                """UPDATE photo_files
+                   SET is_original = 0, binary_verified = 1,
+                       original_reference = ?, last_update_date = ?,
+                       last_update_type = ?
+                   WHERE file_path = ?""", dup_updates)
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO duplicate_groups
+                   (group_hash, file_count, total_size, original_file,
+                    date_created)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(group_hash, file_count, total_size, original, now_iso)
+                 for group_hash, file_count, total_size, original
+                 in group_rows])
+        except sqlite3.Error as e:
+            self.conn.execute("ROLLBACK TO apply_group")
+            self.conn.execute("RELEASE apply_group")
+            print(f"⚠️ Could not record group "
+                  f"{group_rows[0][0][:12]}...: {e}")
+            return 0, 0, 0
+        self.conn.execute("RELEASE apply_group")
+        return len(group_rows), len(orig_updates), len(dup_updates)
+
+    def _quick_signature(self, file_path, file_size):
+        """4 KiB samples from the head, middle and tail of a file.
+
+        Cached per path: a file can sit in several candidate pairs, and
+        over SMB three small reads are far cheaper than a full pass.
+        Returns None on read errors so a broken file never matches.
+        """
+        cached = self._signature_cache.get(file_path)
+        if cached is not None:
+            return cached
+        try:
+            with open(file_path, 'rb') as f:
+                parts = [f.read(4096)]
+                if file_size > 8192:
+                    f.seek(file_size // 2)
+                    parts.append(f.read(4096))
+                if file_size > 4096:
+                    f.seek(max(file_size - 4096, 0))
+                    parts.append(f.read(4096))
+            signature = b''.join(parts)
+        except OSError:
+            return None
+        self._signature_cache[file_path] = signature
+        return signature
+
+    def _determine_original_file_safety(self, file_paths, metadata=None):
+        """Pick which copy to keep: EXIF date, then mtime, then name.
+
+        metadata maps file_path -> (exif_date_iso, file_mtime) as the
+        scan pass already stored them, so choosing an original costs a
+        dict lookup and a fromisoformat parse instead of re-decoding
+        EXIF and re-statting every candidate. Paths absent from the map
+        (databases written before these columns were filled) fall back
+        to disk.
+        """
+        # Plain tuple comparison: earliest capture date wins, ties
+        # break on mtime, and "copy"-style names lose to clean ones.
+        # Only the winner matters, so a running minimum does it in one
+        # O(N) pass with no candidate list to build and sort.
+        best = None
+        for file_path in file_paths:
+            exif_iso = mtime = None
+            if metadata is not None:
+                exif_iso, mtime = metadata.get(file_path, (None, None))
+            exif_date = (datetime.fromisoformat(exif_iso) if exif_iso
+                         else None)
+            if mtime is None:
+                exif_date = exif_date or self.extract_exif_date(file_path)
+                mtime = os.stat(file_path).st_mtime
+            name_priority = (1 if 'copy'
+                             in os.path.basename(file_path).lower() else 0)
+            candidate = (exif_date or datetime.max,
+                         datetime.fromtimestamp(mtime),
+                         name_priority, file_path)
+            if best is None or candidate < best:
+                best = candidate
+        return best[3]
+
+    def flag_deletions_safety(self):
+        """Flag verified duplicates whose original is safely recorded.
+
+        A self-join resolves the "does the recorded original still hold
+        is_original=1?" check in one query instead of a SELECT per
+        candidate; candidates that drop out of the join are reported as
+        missing originals via a set difference.
+        """
+        candidates = {row[0] for row in self.conn.execute(
+            """SELECT file_path FROM photo_files
+               WHERE binary_verified = 1 AND is_original = 0
+                 AND removal_flagged = 0 AND deleted = 0""")}
+        rows = self.conn.execute(
+            """SELECT d.file_path, d.original_reference
+               FROM photo_files d
+               JOIN photo_files o ON o.file_path = d.original_reference
+               WHERE d.binary_verified = 1 AND d.is_original = 0
+                 AND d.removal_flagged = 0 AND d.deleted = 0
+                 AND o.is_original = 1""").fetchall()
+        for file_path in candidates.difference(r[0] for r in rows):
+            print(f"⚠️ Original not found for {file_path}, skipping")
+        now_iso = datetime.now().isoformat()
+        pending = []
+        for file_path, original_reference in rows:
+            pending.append((now_iso, f"Duplicate of {original_reference}",
+                            file_path))
+            self._vprint(f"  🚩 Flagged {file_path}")
+        with self.conn:
+            self.conn.executemany(
+                """UPDATE photo_files
+                   SET removal_flagged = 1, last_update_date = ?,
+                       last_update_type = 'FLAGGED_FOR_DELETION',
+                       notes = ?
+                   WHERE file_path = ?""", pending)
+        print(f"✅ {len(pending)} files flagged for deletion")
+
+    def _create_deletion_path(self, file_path):
+        """Mirror a file's path under ToBeDeleted instead of Sorted.
+
+        The Sorted -> ToBeDeleted swap and the mkdir are cached per
+        source folder: flagged files cluster in the same folders, so
+        the Path parsing and the mkdir (a round trip on SMB) run once
+        per folder instead of once per file.
+        """
+        parent = os.path.dirname(file_path)
+        deletion_parent = self._deletion_parent_cache.get(parent)
+        if deletion_parent is None:
+            parts = list(Path(parent).parts)
+            if 'Sorted' in parts:
+                parts[parts.index('Sorted')] = 'ToBeDeleted'
+                deletion_parent = Path(*parts)
+            else:
+                deletion_parent = Path(self.photo_dir) / 'ToBeDeleted'
+            deletion_parent.mkdir(parents=True, exist_ok=True)
+            self._deletion_parent_cache[parent] = deletion_parent
+        return str(deletion_parent / os.path.basename(file_path))
+
+    def execute_deletions_safety(self):
+        """Move flagged files into ToBeDeleted (never a real delete)."""
+        rows = self.conn.execute(
+            """SELECT file_path, original_reference FROM photo_files
+               WHERE removal_flagged = 1 AND deleted = 0""").fetchall()
+        # One directory listing per parent folder instead of an exists()
+        # stat per file: flagged files cluster in the same folders, and
+        # over SMB a listing is one round trip where N stats are N.
+        present = {}
+        for parent in {os.path.dirname(fp) for fp, _ in rows}:
+            try:
+                present[parent] = {e.name for e in os.scandir(parent)}
+            except OSError:
+                present[parent] = set()
+
+        # Resolve targets (creating their folders) on this thread, then
+        # fan the moves out over a small pool — each move is an SMB
+        # round trip, and eight in flight overlap that latency without
+        # hammering the NAS.
+        moves = []
+        for file_path, original_reference in rows:
+            if (os.path.basename(file_path)
+                    not in present[os.path.dirname(file_path)]):
+                print(f"⚠️ Missing, skipping: {file_path}")
+                continue
+            moves.append((file_path, self._create_deletion_path(file_path)))
+
+        def _move_one(job):
+            file_path, deletion_path = job
+            try:
+                shutil.move(file_path, deletion_path)
+            except OSError as e:
+                return file_path, deletion_path, e
+            return file_path, deletion_path, None
+
+        now_iso = datetime.now().isoformat()
+        pending = []
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for file_path, deletion_path, error in executor.map(
+                    _move_one, moves):
+                if error is not None:
+                    print(f"❌ Could not move {file_path}: {error}")
+                    continue
+                pending.append((now_iso, f"Moved to {deletion_path}",
+                                file_path))
+                self._vprint(f"  ➡️ Moved {file_path}")
+        with self.conn:
+            self.conn.executemany(
+                """UPDATE photo_files
+                   SET deleted = 1, last_update_date = ?,
+                       last_update_type = 'MOVED_TO_DELETION',
+                       notes = ?
+                   WHERE file_path = ?""", pending)
+        print(f"✅ {len(pending)} files moved to ToBeDeleted")
+
+    def generate_report_safety(self):
+        """Write the safety-mode text report.
+
+        One duplicate query up front instead of one SELECT per group,
+        sizes from the database instead of a stat per duplicate, and
+        the whole report assembled in memory and written in one call —
+        on a NAS-backed report folder every small write is its own SMB
+        request.
+        """
+        groups = self.conn.execute(
+            """SELECT group_hash, file_count, total_size, original_file
+               FROM duplicate_groups ORDER BY total_size DESC""").fetchall()
+        dups_by_original = defaultdict(list)
+        for row in self.conn.execute(
+                """SELECT original_reference, file_path, file_size,
+                          removal_flagged, deleted
+                   FROM photo_files
+                   WHERE original_reference IS NOT NULL"""):
+            dups_by_original[row[0]].append(row[1:])
+
+        parts = ["Unified Duplicate Detector Report (safety)\n",
+                 "=" * 50 + "\n",
+                 f"Generated: {datetime.now().isoformat()}\n",
+                 f"Duplicate groups: {len(groups)}\n",
+                 f"Verification: "
+                 f"{'binary compare' if self.strict_verify else 'hash + size'}\n",
+                 "\n"]
+        for group_hash, file_count, total_size, original_file in groups:
+            parts.append(f"Group {group_hash[:12]}... "
+                         f"({file_count} files, "
+                         f"{total_size / (1024 * 1024):.2f} MB)\n")
+            parts.append(f"  🟢 {original_file}\n")
+            for dup_file, file_size, removal_flagged, deleted in \
+                    dups_by_original[original_file]:
+                size_text = (f"{file_size / (1024 * 1024):.2f} MB"
+                             if not deleted else "moved")
+                status = ("DELETED" if deleted
+                          else "FLAGGED" if removal_flagged
+                          else "VERIFIED")
+                parts.append(f"  🔴 {dup_file} ({size_text}) - {status}\n")
+            parts.append("\n")
+        with open(REPORT_PATH, 'w', encoding='utf-8',
+                  buffering=1 << 20) as f:
+            f.write(''.join(parts))
+        print(f"📄 Report written to {REPORT_PATH}")
+
+    def run_safety(self, execute_deletions=False):
+        """Full safety-mode pipeline."""
+        self.scan_folders_safety()
+        self.verify_and_process_duplicates_safety()
+        self.flag_deletions_safety()
+        if execute_deletions:
+            self.execute_deletions_safety()
+        self.generate_report_safety()
+        refresh_summary(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+# === MAIN FUNCTION ===
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Unified Photo Duplicate Detector v1.0")
+    parser.add_argument("--mode", choices=("performance", "safety"),
+                        default="performance",
+                        help="performance: fast scan+report; safety: "
+                             "binary-verified pipeline with staged moves")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="Near-duplicate similarity threshold "
+                             "(default 0.9)")
+    parser.add_argument("--execute-deletions", action="store_true",
+                        help="Safety mode: actually move flagged files "
+                             "into ToBeDeleted")
+    parser.add_argument("--strict-verify", action="store_true",
+                        help="Safety mode: byte-compare every hash group "
+                             "instead of trusting MD5 + matching size")
+    args = parser.parse_args()
+
+    detector = UnifiedDuplicateDetector(similarity_threshold=args.threshold,
+                                        strict_verify=args.strict_verify)
+    try:
+        if args.mode == "performance":
+            detector.run_performance()
+        else:
+            detector.run_safety(execute_deletions=args.execute_deletions)
+    finally:
+        detector.close()
+
+
+if __name__ == "__main__":
+    main()